@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+##############################################################################################################
+# Contact: Will Rivendell
+# 	E1: wrivendell@splunk.com
+# 	E2: contact@willrivendell.com
+##############################################################################################################
+# Compares CSVFile point lookups / updates through the SQLite index (wr_csv_index) against
+# a full parse of the CSV per call (pandas.read_csv if installed, else stdlib csv)
+# Usage: python3 benchmarks/bench_csv_index.py [rows] [lookups]     (default 1000000 rows, 200 lookups)
+
+### IMPORTS ###########################################
+import os, sys, csv, time, random, tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'splunk-tintri-vmstats', 'bin'))
+from lib import wr_csv_index
+
+try:
+	import pandas
+except ImportError:
+	pandas = None
+
+### FUNCTIONS ###########################################
+def writeCSV(path:str, rows:int):
+	with open(path, 'w', newline='') as csv_file:
+		writer = csv.writer(csv_file)
+		writer.writerow(['vm_uuid', 'tintri_name', 'percent_used', 'status'])
+		for i in range(rows):
+			writer.writerow(['vm-' + str(i), 'vmstore' + str(i % 16), str(i % 100), 'new'])
+
+def fullScanLookup(path:str, key:str) -> list:
+	if pandas:
+		df = pandas.read_csv(path)
+		return(df.loc[df['vm_uuid'] == key, 'percent_used'].tolist())
+	with open(path, 'r', newline='') as csv_file:
+		return([r[2] for r in csv.reader(csv_file) if r[0] == key])
+
+def timed(label:str, count:int, func):
+	start = time.perf_counter()
+	func()
+	elapsed = time.perf_counter() - start
+	print("{:<40} {:>10.3f}s total {:>12.3f}ms/op".format(label, elapsed, elapsed / max(count, 1) * 1000))
+	return(elapsed)
+
+### RUNTIME ###########################################
+rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+scan_lookups = min(lookups, 3)
+keys = ['vm-' + str(random.randrange(rows)) for _ in range(lookups)]
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+	csv_path = os.path.join(tmp_dir, 'bench.csv')
+	print("rows: " + str(rows) + "  lookups: " + str(lookups) + "  full scan engine: " + ('pandas' if pandas else 'csv'))
+	timed("write csv", rows, lambda: writeCSV(csv_path, rows))
+	index = None
+	def build():
+		global index
+		index = wr_csv_index.CSVIndex(csv_path)
+		index.ensureIndex('vm_uuid')
+		index.commit()
+	timed("build index (one time)", rows, build)
+	timed("full parse lookup", scan_lookups, lambda: [fullScanLookup(csv_path, k) for k in keys[:scan_lookups]])
+	timed("indexed lookup", lookups, lambda: [index.getValues('vm_uuid', k, 'percent_used') for k in keys])
+	def update():
+		for k in keys:
+			index.updateCell('vm_uuid', k, 'status', 'done')
+		index.commit()
+	timed("indexed update", lookups, update)
+	timed("flush updates to csv", 1, index.flushToCSV)
+	index.close()
+	timed("reopen index (csv unchanged)", 1, lambda: wr_csv_index.CSVIndex(csv_path).close())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+##############################################################################################################
+# Contact: Will Rivendell
+# 	E1: wrivendell@splunk.com
+# 	E2: contact@willrivendell.com
+##############################################################################################################
+# Startup import budget for script.py - runs script.py's own top level import statements (read out of the file,
+# so new imports are always measured) under `python -X importtime` in a fresh interpreter and fails (exit 1) if
+# a module or the whole import block goes over its budget, or if pandas gets imported at startup
+# Usage: python3 benchmarks/bench_import_time.py [runs]     (default 5 runs, the fastest run is reported)
+
+### IMPORTS ###########################################
+import os, sys, ast, subprocess
+
+### GLOBALS ###########################################
+BIN_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'splunk-tintri-vmstats', 'bin')
+# cumulative import time budgets in ms, measured on a forwarder class box with ~2x headroom
+# lib.wr_logging was ~33ms here once pandas (~465ms on its own) stopped being imported at load
+IMPORT_BUDGET_MS = {
+	'lib.wr_logging': 60,
+	'lib.wr_arguments': 40,
+	'requests': 250,
+	'urllib3': 150,
+}
+START_MARKER = 'bench: script.py imports start' # interpreter startup (site ...) is logged before it and not counted
+# whole import block of script.py (every top level import, stdlib and lib/ included) - ~140ms here
+TOTAL_BUDGET_MS = 300
+# never allowed at startup, only the csv query methods load them
+FORBIDDEN_AT_STARTUP = ('pandas', 'numpy', 'pyarrow')
+
+### FUNCTIONS ###########################################
+def startupImports() -> str:
+	'''
+	script.py's top level import statements, one per module, each printing the module's name if it is not installed
+	wr_arguments parses sys.argv when imported, so a minimal valid command line is set first
+	'''
+	with open(os.path.join(BIN_FOLDER, 'script.py'), 'r') as script_file:
+		tree = ast.parse(script_file.read())
+	lines = ["import sys", "sys.argv = ['script.py', '-sn', 'bench']", "sys.stderr.write(" + repr(START_MARKER + "\n") + ")"]
+	for node in tree.body:
+		if isinstance(node, ast.Import):
+			statements = [(ast.unparse(ast.Import(names=[alias])), alias.name) for alias in node.names]
+		elif isinstance(node, ast.ImportFrom):
+			statements = [(ast.unparse(ast.ImportFrom(module=node.module, names=[alias], level=node.level)), (node.module or '') + '.' + alias.name) for alias in node.names]
+		else:
+			continue
+		for statement, name in statements:
+			lines += ["try:", "\t" + statement, "except ImportError:", "\tprint(" + repr(name) + ")"]
+	return("\n".join(lines) + "\n")
+
+def measureOnce(startup_imports:str) -> tuple:
+	'''
+	Returns ({module: cumulative_ms}, total_ms) for one cold interpreter start, total being the sum of the
+	top level (not nested) imports
+	'''
+	result = subprocess.run([sys.executable, '-X', 'importtime', '-c', startup_imports], cwd=BIN_FOLDER, capture_output=True, text=True)
+	if not result.returncode == 0:
+		print(result.stderr)
+		sys.exit(1)
+	times = {}
+	total = 0.0
+	started = False
+	missing = result.stdout.split()
+	for line in result.stderr.splitlines():
+		if line == START_MARKER:
+			started = True
+			continue
+		if not line.startswith('import time:') or 'cumulative' in line:
+			continue
+		self_us, cumulative_us, module = line[len('import time:'):].split('|')
+		if not module.strip() in missing:
+			times[module.strip()] = int(cumulative_us) / 1000
+		if started and not module.startswith('  '): # one space after the bar, nested imports are indented further
+			total += int(cumulative_us) / 1000
+	return(times, total)
+
+### RUNTIME ###########################################
+runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+startup_imports = startupImports()
+best = {}
+best_total = None
+for _ in range(runs):
+	times, total = measureOnce(startup_imports)
+	for module, ms in times.items():
+		best[module] = min(ms, best.get(module, ms))
+	best_total = total if best_total is None else min(total, best_total)
+
+over_budget = False
+print("{:<24} {:>12} {:>12}".format("module", "best ms", "budget ms"))
+for module, budget in IMPORT_BUDGET_MS.items():
+	if not module in best:
+		print("{:<24} {:>12} {:>12}".format(module, "not installed", budget))
+		continue
+	status = "" if best[module] <= budget else "  OVER BUDGET"
+	over_budget = over_budget or bool(status)
+	print("{:<24} {:>12.1f} {:>12}{}".format(module, best[module], budget, status))
+for module in sorted(m for m in best if m.startswith('lib.') and not m in IMPORT_BUDGET_MS):
+	print("{:<24} {:>12.1f} {:>12}".format(module, best[module], "-"))
+status = "" if best_total <= TOTAL_BUDGET_MS else "  OVER BUDGET"
+over_budget = over_budget or bool(status)
+print("{:<24} {:>12.1f} {:>12}{}".format("script.py imports", best_total, TOTAL_BUDGET_MS, status))
+for module in FORBIDDEN_AT_STARTUP:
+	if module in best:
+		print(module + " was imported at startup (" + str(round(best[module], 1)) + "ms) - it must only be loaded on demand")
+		over_budget = True
+sys.exit(1 if over_budget else 0)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+##############################################################################################################
+# Contact: Will Rivendell
+# 	E1: wrivendell@splunk.com
+# 	E2: contact@willrivendell.com
+##############################################################################################################
+# Cold start time of the TA, loose bin/ layout vs the zipapp built by tools/build_zipapp.py
+# Each run starts a fresh interpreter against an unresolvable device in CSV only mode, so it gets through every import,
+# argument parsing and the first (failing, DNS) login before exiting - -h would exit inside wr_arguments' import time
+# parse_args, before the rest of lib/ is even imported
+# Logs, CSVs and state of the runs go to a temporary folder
+# The loose layout needs requests / urllib3 installed in this python, the zipapp carries its own
+# Usage: python3 benchmarks/bench_startup.py [runs] [path to .pyz]     (default 20 runs, dist/splunk-tintri-vmstats.pyz)
+
+### IMPORTS ###########################################
+import os, sys, time, subprocess, statistics, tempfile
+
+### GLOBALS ###########################################
+REPO_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BIN_FOLDER = os.path.join(REPO_FOLDER, 'src', 'splunk-tintri-vmstats', 'bin')
+UNREACHABLE_DEVICE = 'unreachable.invalid' # .invalid never resolves (RFC 2606)
+
+### FUNCTIONS ###########################################
+def timeStarts(command:list, runs:int, cwd:str) -> list:
+	times = []
+	for _ in range(runs):
+		start = time.perf_counter()
+		result = subprocess.run(command, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+		times.append((time.perf_counter() - start) * 1000)
+		if not result.returncode == 0:
+			print(" ".join(command) + " failed:\n" + result.stderr.decode())
+			return([])
+	return(times)
+
+def report(label:str, times:list):
+	if not times:
+		print("{:<10} failed".format(label))
+		return
+	print("{:<10} median {:>8.1f}ms   min {:>8.1f}ms   max {:>8.1f}ms".format(label, statistics.median(times), min(times), max(times)))
+
+### RUNTIME ###########################################
+runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+pyz = sys.argv[2] if len(sys.argv) > 2 else os.path.join(REPO_FOLDER, 'dist', 'splunk-tintri-vmstats.pyz')
+if not os.path.exists(pyz):
+	sys.exit(pyz + " not found, build it first with: python3 tools/build_zipapp.py")
+
+print("runs: " + str(runs))
+with tempfile.TemporaryDirectory() as scratch:
+	ta_args = ['-sn', UNREACHABLE_DEVICE, '-un', 'bench', '-pw', 'bench', '-csvo', 'True', '-ll', scratch, '-csvl', scratch, '-sl', scratch]
+	report("loose", timeStarts([sys.executable, 'script.py'] + ta_args, runs, BIN_FOLDER))
+	report("zipapp", timeStarts([sys.executable, os.path.abspath(pyz)] + ta_args, runs, REPO_FOLDER))
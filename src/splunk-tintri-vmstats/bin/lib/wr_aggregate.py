@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+##############################################################################################################
+# Contact: Will Rivendell
+# 	E1: wrivendell@splunk.com
+# 	E2: contact@willrivendell.com
+##############################################################################################################
+
+### IMPORTS ###########################################
+import sys, time
+
+### CLASSES ###########################################
+
+class WindowAggregator():
+	'''
+	Folds a stream of samples into tumbling windows of window_seconds per key (device, datastore, VM ...)
+	Each key holds one open window: per numeric field [min, max, sum, count, last] - constant memory per key
+	no matter how many samples arrive
+	A window is closed and returned as one summary dict when a sample for a later window arrives for its key,
+	when flushDue() sees its end has passed, or on flushAll() at shutdown
+	flushDue() goes by the key's own sample clock - its newest sample time, moved on by the local time passed since
+	that sample arrived - so a forwarder clock that disagrees with the appliance's doesn't close windows early or late
+	Samples older than a key's open window, or in a window already closed (late / out of order), are counted and left out
+	'''
+	def __init__(self, window_seconds:float, key_fields:tuple, time_field='time', grace_seconds=0, debug=False):
+		self.window_seconds = max(float(window_seconds), 1.0)
+		self.key_fields = tuple(key_fields)
+		self.time_field = time_field
+		self.grace_seconds = grace_seconds
+		self.debug = debug
+		self.windows = {} # key tuple -> [window_start, {field: [min, max, sum, count, last]}, sample count]
+		self.clocks = {} # key tuple -> [newest sample time, local time it arrived, start of the last closed window]
+		self.samples_in = 0
+		self.windows_out = 0
+		self.late_samples = 0
+
+	def windowStart(self, sample_time:float) -> float:
+		return(sample_time - (sample_time % self.window_seconds))
+
+	def add(self, sample:dict) -> list:
+		'''
+		Folds one sample in, returns the windows it closed (usually none)
+		'''
+		self.samples_in += 1
+		key = tuple(sample.get(field) for field in self.key_fields)
+		now = time.time()
+		sample_time = sample.get(self.time_field)
+		if sample_time is None:
+			sample_time = now
+		start = self.windowStart(sample_time)
+		closed = []
+		window = self.windows.get(key)
+		clock = self.clocks.get(key)
+		if (window is not None and start < window[0]) or (clock is not None and clock[2] is not None and start <= clock[2]):
+			self.late_samples += 1
+			return(closed)
+		if clock is None:
+			clock = self.clocks[key] = [sample_time, now, None]
+		elif sample_time >= clock[0]:
+			clock[0] = sample_time
+			clock[1] = now
+		if window is not None and start > window[0]:
+			closed.append(self.close(key))
+			window = None
+		if window is None:
+			window = self.windows[key] = [start, {}, 0]
+		window[2] += 1
+		stats = window[1]
+		for field, value in sample.items():
+			if field == self.time_field or field in self.key_fields or isinstance(value, bool) or not isinstance(value, (int, float)):
+				continue
+			slot = stats.get(field)
+			if slot is None:
+				stats[field] = [value, value, value, 1, value]
+				continue
+			if value < slot[0]:
+				slot[0] = value
+			if value > slot[1]:
+				slot[1] = value
+			slot[2] += value
+			slot[3] += 1
+			slot[4] = value
+		return(closed)
+
+	def close(self, key:tuple) -> dict:
+		start, stats, count = self.windows.pop(key)
+		if key in self.clocks:
+			self.clocks[key][2] = start
+		summary = dict(zip(self.key_fields, key))
+		summary.update({'window_start': start, 'window_end': start + self.window_seconds, 'window_seconds': self.window_seconds, 'count': count})
+		for field, (minimum, maximum, total, field_count, last) in stats.items():
+			summary[field + '_min'] = minimum
+			summary[field + '_max'] = maximum
+			summary[field + '_avg'] = total / field_count
+			summary[field + '_last'] = last
+		self.windows_out += 1
+		return(summary)
+
+	def flushDue(self, now=None) -> list:
+		'''
+		Closes every window whose end (plus grace_seconds for stragglers) has passed on its key's sample clock
+		now is local time, by default time.time()
+		'''
+		now = now if now is not None else time.time()
+		due = []
+		for key, window in self.windows.items():
+			newest, arrived = self.clocks[key][:2]
+			if window[0] + self.window_seconds + self.grace_seconds <= newest + max(now - arrived, 0):
+				due.append(key)
+		return([self.close(key) for key in due])
+
+	def flushAll(self) -> list:
+		'''
+		Closes every open window, partial ones included - call on shutdown
+		'''
+		closed = [self.close(key) for key in list(self.windows.keys())]
+		if self.debug:
+			print("- WRAggregate(" + str(sys._getframe().f_lineno) +"): " + str(self.samples_in) + " samples folded into " + str(self.windows_out) + " windows, " + str(self.late_samples) + " late -")
+		return(closed)
+
+	def __len__(self) -> int:
+		return(len(self.windows))
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+##############################################################################################################
+# Contact: Will Rivendell
+# 	E1: wrivendell@splunk.com
+# 	E2: contact@willrivendell.com
+##############################################################################################################
+
+### IMPORTS ###########################################
+import math, collections
+
+### GLOBALS ###########################################
+DEFAULT_ALPHA = 0.05 # weight of the newest sample in the baselines, ~20 samples of memory
+DEFAULT_ZSCORE = 3.0
+DEFAULT_WARMUP = 20 # samples per metric before anything can be called an anomaly
+DEFAULT_CONTEXT = 5 # full resolution samples kept before and sent after an anomaly
+DEFAULT_DOWNSAMPLE = 12 # every Nth uneventful sample is still sent, 0 = none
+DEFAULT_MIN_RELATIVE_STD = 0.05 # the deviation a metric is scored against never drops below 5% of its mean ...
+DEFAULT_MIN_STD = 0.001 # ... or this, so a change after a flat stretch isn't an infinite z-score
+# the rate and latency fields of wr_tintri.VM_STAT_FIELDS - space / capacity fields move in slow steps, not spikes
+DEFAULT_METRICS = (
+	'iops_total',
+	'iops_read',
+	'iops_write',
+	'throughput_total_mbps',
+	'throughput_read_mbps',
+	'throughput_write_mbps',
+	'latency_total_ms',
+	'latency_host_ms',
+	'latency_network_ms',
+	'latency_storage_ms',
+	'latency_disk_ms',
+)
+
+### CLASSES ###########################################
+
+class AnomalyGate():
+	'''
+	Edge filter for high frequency samples: keeps an EWMA mean / variance baseline per key (device, datastore ...)
+	and numeric metric, and flags a sample as anomalous when any metric is more than zscore deviations off its baseline
+	Around anomalies every sample is passed on (context samples before, from a small ring, and after), the rest
+	is downsampled to every downsample_every-th sample - so the volume sent follows what is happening on the array
+	Baselines are O(1) per metric and sample, the context ring is the only buffer
+	Only the given metrics are scored (None = every numeric field), and the standard deviation they are scored
+	against is floored at min_relative_std of the mean (min_std absolute), so flat series don't flag tiny steps
+	'''
+	def __init__(self, key_fields:tuple, alpha=DEFAULT_ALPHA, zscore=DEFAULT_ZSCORE, warmup=DEFAULT_WARMUP, context=DEFAULT_CONTEXT, downsample_every=DEFAULT_DOWNSAMPLE, time_field='time', metrics=DEFAULT_METRICS, min_relative_std=DEFAULT_MIN_RELATIVE_STD, min_std=DEFAULT_MIN_STD):
+		self.key_fields = tuple(key_fields)
+		self.metrics = frozenset(metrics) if metrics is not None else None
+		self.min_relative_std = max(float(min_relative_std), 0.0)
+		self.min_std = max(float(min_std), 1e-12)
+		self.alpha = min(max(float(alpha), 0.001), 1.0)
+		self.zscore = float(zscore)
+		self.warmup = int(warmup)
+		self.context = max(int(context), 0)
+		self.downsample_every = max(int(downsample_every), 0)
+		self.time_field = time_field
+		self.keys = {} # key tuple -> {'baselines': {metric: [mean, variance, n]}, 'before': deque, 'after': int, 'quiet': int}
+		self.samples_in = 0
+		self.samples_out = 0
+		self.anomalies = 0
+
+	def score(self, baselines:dict, sample:dict) -> tuple:
+		'''
+		Updates the baselines with the sample, returns (worst |z|, [metrics over the threshold]) measured before the update
+		'''
+		worst = 0.0
+		fields = []
+		for field, value in sample.items():
+			if field == self.time_field or field in self.key_fields or isinstance(value, bool) or not isinstance(value, (int, float)):
+				continue
+			if self.metrics is not None and field not in self.metrics:
+				continue
+			baseline = baselines.get(field)
+			if baseline is None:
+				baselines[field] = [float(value), 0.0, 1]
+				continue
+			mean, variance, n = baseline
+			deviation = value - mean
+			if n >= self.warmup:
+				z = abs(deviation) / math.sqrt(max(variance, (self.min_relative_std * abs(mean)) ** 2, self.min_std ** 2))
+				if z > self.zscore:
+					fields.append(field)
+				worst = max(worst, z)
+			# incremental EWMA mean and variance
+			increment = self.alpha * deviation
+			baseline[0] = mean + increment
+			baseline[1] = (1 - self.alpha) * (variance + deviation * increment)
+			baseline[2] = n + 1
+		return(worst, fields)
+
+	def process(self, sample:dict) -> list:
+		'''
+		Takes one sample, returns the samples to send now (none, this one, or this one with its preceding context)
+		Anomalous samples get anomaly=1, anomaly_fields and anomaly_zscore added, downsampled ones downsample_factor
+		'''
+		self.samples_in += 1
+		key = tuple(sample.get(field) for field in self.key_fields)
+		key_state = self.keys.get(key)
+		if key_state is None:
+			key_state = self.keys[key] = {'baselines': {}, 'before': collections.deque(maxlen=self.context or 1), 'after': 0, 'quiet': 0}
+		worst, fields = self.score(key_state['baselines'], sample)
+		out = []
+		if fields:
+			self.anomalies += 1
+			flagged = dict(sample)
+			flagged.update({'anomaly': 1, 'anomaly_fields': ','.join(fields), 'anomaly_zscore': round(min(worst, 1e9), 3)})
+			if self.context:
+				out.extend(key_state['before'])
+			key_state['before'].clear()
+			out.append(flagged)
+			key_state['after'] = self.context
+		elif key_state['after'] > 0:
+			key_state['after'] -= 1
+			out.append(sample)
+		else:
+			key_state['quiet'] += 1
+			if self.downsample_every and key_state['quiet'] % self.downsample_every == 0:
+				downsampled = dict(sample)
+				downsampled['downsample_factor'] = self.downsample_every
+				out.append(downsampled)
+			elif self.context:
+				key_state['before'].append(sample)
+		self.samples_out += len(out)
+		return(out)
+
+	def summary(self) -> dict:
+		return({
+			'samples_in': self.samples_in,
+			'samples_sent': self.samples_out,
+			'anomalies': self.anomalies,
+			'volume_saved_pct': round((1 - self.samples_out / self.samples_in) * 100, 2) if self.samples_in else 0,
+		})
@@ -50,12 +50,51 @@ def Arguments():
 	parser.add_argument("-met", "--metrics", type=str2bool, nargs="?", const=True, default=False, required=False, help="True to send the data as Metrics via HEC token.")
 	parser.add_argument("-csv", "--csv_output", type=str2bool, nargs="?", const=True, default=False, required=False, help="Write out a CSV of stats data.")
 	parser.add_argument("-csvo", "--csv_only", type=str2bool, nargs="?", const=True, default=False, required=False, help="Write out a CSV of stats data only and skip send to Splunk.")
+	parser.add_argument("-ads", "--all_datastores", type=str2bool, nargs="?", const=True, default=False, required=False, help="True to collect the statsSummary of every datastore (one datastore_stats event each, the device event becomes their rollup, datastore list cached in state_location), default datastore/default only.")
+	parser.add_argument("-dslh", "--datastore_list_hours", type=checkPositive, nargs="?", required=False, default=24, help="How many hours the cached datastore list of a device is reused before it is listed again.")
+	parser.add_argument("-vm", "--vm_stats", type=str2bool, nargs="?", const=True, default=False, required=False, help="Also collect per VM stats (IOPS, throughput, latency, space) from every device, one event / metric per VM.")
+	parser.add_argument("-vmps", "--vm_page_size", type=checkPositive, nargs="?", required=False, default=100, help="How many VMs to request per page when collecting per VM stats.")
+	parser.add_argument("-vmi", "--vm_incremental", type=str2bool, nargs="?", const=True, default=False, required=False, help="Only emit VMs whose lastUpdatedTime moved since the last run (per device watermarks kept in state_location).")
+	parser.add_argument("-vmfs", "--vm_full_sweep_hours", type=float, nargs="?", required=False, default=24, help="With vm_incremental, emit every VM (and detect deleted VMs) at most this many hours apart.")
+	parser.add_argument("-vmr", "--vm_rollup", type=str2bool, nargs="?", const=True, default=False, required=False, help="With vm_stats, also send a per device and fleet rollup: top N VMs and p50/p95/p99 per metric (latency, IOPS, throughput, space).")
+	parser.add_argument("-vmrn", "--vm_rollup_top", type=checkPositive, nargs="?", required=False, default=10, help="How many VMs the rollup lists per metric.")
+	parser.add_argument("-vmro", "--vm_rollup_only", type=str2bool, nargs="?", const=True, default=False, required=False, help="Send only the rollups, not one event per VM (turns vm_rollup on).")
+	parser.add_argument("-ss", "--snapshot_stats", type=str2bool, nargs="?", const=True, default=False, required=False, help="Also collect snapshot count / latest snapshot age metrics per VM and per device.")
+	parser.add_argument("-ssc", "--snapshot_changes", type=str2bool, nargs="?", const=True, default=False, required=False, help="With snapshot stats, only send snapshot_created / snapshot_deleted events for the churn since the last run (per device uuid sets in state_location).")
+	parser.add_argument("-ssps", "--snapshot_page_size", type=checkPositive, nargs="?", required=False, default=500, help="How many snapshots to request per page when collecting snapshot stats.")
+	parser.add_argument("-inv", "--inventory", type=str2bool, nargs="?", const=True, default=False, required=False, help="Also send one vm_inventory event per VM joining its stats, virtual disks and latest snapshot (one pass over /vm, /virtualDisk and /snapshot).")
+	parser.add_argument("-rts", "--realtime_seconds", type=checkPositive, nargs="?", required=False, default=0, help="After the regular collection, sample each device's realtime stats for this many seconds (0 = off).")
+	parser.add_argument("-rti", "--realtime_interval", type=checkPositive, nargs="?", required=False, default=5, help="Seconds between realtime samples of a device.")
+	parser.add_argument("-rtb", "--realtime_buffer", type=checkPositive, nargs="?", required=False, default=720, help="Realtime samples buffered per device before the oldest are dropped.")
+	parser.add_argument("-aggs", "--aggregate_seconds", type=checkPositive, nargs="?", required=False, default=0, help="Fold realtime samples into tumbling windows of this many seconds (min/max/avg/last/count) and send only the windows (0 = send every sample).")
+	parser.add_argument("-bff", "--backfill_from", type=str, nargs="?", required=False, default=None, help="Backfill historic stats from this time (epoch seconds or ISO 8601, UTC if no timezone), resumes from the per device checkpoint in state_location.")
+	parser.add_argument("-bft", "--backfill_to", type=str, nargs="?", required=False, default=None, help="Backfill historic stats up to this time (default now).")
+	parser.add_argument("-bfw", "--backfill_window_minutes", type=checkPositive, nargs="?", required=False, default=60, help="Historic stats are pulled and checkpointed one window of this many minutes at a time.")
+	parser.add_argument("-hist", "--history", type=str2bool, nargs="?", const=True, default=False, required=False, help="Keep a local capacity time series per device (SQLite, in state_location/history) and add the change in used space over 1 / 7 / 30 days to the device event.")
+	parser.add_argument("-histd", "--history_days", type=checkPositive, nargs="?", required=False, default=730, help="Days of local capacity history kept per device.")
+	parser.add_argument("-fc", "--forecast", type=str2bool, nargs="?", const=True, default=False, required=False, help="Add growth_gib_per_day and days_until_full to every device and datastore event, from a regression kept in state_location (seeded from the local history if history is on).")
+	parser.add_argument("-fchl", "--forecast_half_life_days", type=checkPositive, nargs="?", required=False, default=7, help="Half life in days of the samples in the capacity forecast (smaller follows recent growth more closely).")
+	parser.add_argument("-an", "--anomaly_detection", type=str2bool, nargs="?", const=True, default=False, required=False, help="Keep EWMA baselines of the realtime metrics and send raw samples only around anomalies, downsampled otherwise.")
+	parser.add_argument("-anz", "--anomaly_zscore", type=float, nargs="?", required=False, default=3.0, help="How many standard deviations off its baseline a metric has to be to count as an anomaly.")
+	parser.add_argument("-anc", "--anomaly_context", type=checkPositive, nargs="?", required=False, default=5, help="Full resolution samples sent before and after each anomaly.")
+	parser.add_argument("-and", "--anomaly_downsample", type=checkPositive, nargs="?", required=False, default=12, help="Outside anomalies send every Nth sample (0 = none).")
+	parser.add_argument("-anm", "--anomaly_metrics", nargs="+", required=False, default=None, help="Realtime metrics scored for anomalies, separated by spaces (default the IOPS, throughput and latency fields).")
+	parser.add_argument("-fs", "--fleet_summary", type=str2bool, nargs="?", const=True, default=True, required=False, help="Send one fleet_summary event per run: capacity totals, VM / snapshot counts, worst percent_used and device coverage.")
+	parser.add_argument("-apif", "--api_pages_in_flight", type=checkPositive, nargs="?", required=False, default=4, help="Max concurrent page requests per device when reading paginated Tintri lists (1 = one page at a time).")
+	parser.add_argument("-apm", "--api_pagination", nargs="?", required=False, default='offset', choices=['offset', 'cursor'], help="'offset' fetches offset windows concurrently, 'cursor' follows each page's 'next' cursor and prefetches api_pages_in_flight pages ahead.")
+	parser.add_argument("-apts", "--api_page_seconds", type=float, nargs="?", required=False, default=0, help="If above 0, re-size list pages so each takes about this many seconds, based on the first page's response time.")
+	parser.add_argument("-hecb", "--hec_batch_size", type=checkPositive, nargs="?", required=False, default=500, help="Send events to HEC in batches of this many events.")
+	parser.add_argument("-pq", "--parquet_output", type=str2bool, nargs="?", const=True, default=False, required=False, help="Also write typed, compressed daily Parquet partitions of the stats data (requires pyarrow).")
 	parser.add_argument("-rc", "--retain_csv", type=checkPositive, nargs="?", const=True, default=False, required=False, help="How many days to retain the CSV events, days beyond the number specified here will be deleted.")
 	parser.add_argument("-d", "--debug", type=str2bool, nargs="?", const=True, default=False, required=False, help="Enable extra console logging for troubleshooting of confirmation testing.")
 	parser.add_argument("-dm", "--debug_modules", type=str2bool, nargs="?", const=True, default=False, required=False, help="Will enable deep level debug on all the modules that make up the script. Enable if getting errors, to help dev pinpoint.")
 	parser.add_argument("-ll", "--log_location", nargs="?", required=False, default='./logs', help="Full path to where the log file will be written.")
 	parser.add_argument("-csvl", "--csv_location", nargs="?", required=False, default='./csv', help="Full path to where the csv file will be written.")
+	parser.add_argument("-sl", "--state_location", nargs="?", required=False, default='./state', help="Full path to where state kept between runs (watermarks, checkpoints) will be written.")
+	parser.add_argument("-pql", "--parquet_location", nargs="?", required=False, default='./parquet', help="Full path to where the parquet partitions will be written.")
 
 ############## RUNTIME
 Arguments()
-args = parser.parse_args() 
\ No newline at end of file
+args = parser.parse_args()
+if args.vm_rollup_only:
+	args.vm_rollup = True # the rollups are all that is sent, they have to be built
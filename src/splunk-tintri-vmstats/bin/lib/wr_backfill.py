@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+##############################################################################################################
+# Contact: Will Rivendell
+# 	E1: wrivendell@splunk.com
+# 	E2: contact@willrivendell.com
+##############################################################################################################
+
+### IMPORTS ###########################################
+import sys, datetime
+
+from lib import wr_tintri as tintri
+from lib import wr_state as state
+
+### FUNCTIONS ###########################################
+def parseTime(value) -> float:
+	'''
+	Backfill range bounds: epoch seconds or ISO 8601 (no timezone means UTC), returns epoch seconds
+	'''
+	try:
+		return(float(value))
+	except (TypeError, ValueError):
+		pass
+	parsed = datetime.datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+	if parsed.tzinfo is None:
+		parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+	return(parsed.timestamp())
+
+def isoTime(epoch:float) -> str:
+	return(datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc).isoformat(timespec='milliseconds'))
+
+def iterWindows(start:float, end:float, window_seconds:float):
+	'''
+	Fixed [window_start, window_end) windows covering start .. end, the last one cut short at end
+	'''
+	window_seconds = max(window_seconds, 1)
+	window_start = start
+	while window_start < end:
+		window_end = min(window_start + window_seconds, end)
+		yield(window_start, window_end)
+		window_start = window_end
+
+def historicSamples(server_name:str, datastore_uuid:str, stats) -> list:
+	'''
+	Flattens a statsHistoric response into one sample per stat interval, stamped with the appliance's timeEnd
+	Entries without a readable time are skipped, a backfilled sample without its own time is no use
+	'''
+	if isinstance(stats, dict):
+		stats = stats.get('items') or [stats]
+	samples = []
+	for stat in stats or []:
+		for entry in (stat.get('sortedStats') or []):
+			sample_time = tintri.parseTintriTime(entry.get('timeEnd') or entry.get('timeStart') or '')
+			if sample_time is None:
+				continue
+			sample = {'time': sample_time / 1000, 'tintri_name': server_name, 'datastore_uuid': datastore_uuid}
+			for api_field, field in tintri.VM_STAT_FIELDS.items():
+				if entry.get(api_field) is not None:
+					sample[field] = entry[api_field]
+			samples.append(sample)
+	return(samples)
+
+### CLASSES ###########################################
+
+class BackfillCheckpoint():
+	'''
+	Per device progress of one backfill range, kept in state_folder: everything before done_until has been sent
+	Starting a backfill from the same start time again resumes from done_until (the end may have moved on,
+	e.g. when it defaults to now), a different start time starts over
+	'''
+	def __init__(self, server_name:str, start:float, end:float, state_folder='./state/', debug=False):
+		self.state_file = state.JSONStateFile(server_name + "_backfill", state_folder=state_folder, debug=debug)
+		self.debug = debug
+		if self.state_file.data.get('start') == start and self.state_file.data.get('done_until', start) <= end:
+			self.state_file.data['end'] = end
+			if debug:
+				print("- WRBackfill(" + str(sys._getframe().f_lineno) +") (" + server_name + "): resuming from " + isoTime(self.state_file.data['done_until']) + " -")
+		else:
+			self.state_file.data = {'start': start, 'end': end, 'done_until': start}
+
+	@property
+	def done_until(self) -> float:
+		return(self.state_file.data['done_until'])
+
+	@property
+	def complete(self) -> bool:
+		return(self.done_until >= self.state_file.data['end'])
+
+	def advance(self, done_until:float) -> bool:
+		self.state_file.data['done_until'] = done_until
+		return(self.state_file.save())
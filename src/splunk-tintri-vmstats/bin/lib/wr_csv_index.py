@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+##############################################################################################################
+# Contact: Will Rivendell
+# 	E1: wrivendell@splunk.com
+# 	E2: contact@willrivendell.com
+##############################################################################################################
+
+### IMPORTS ###########################################
+import os, csv, sqlite3, sys
+
+### FUNCTIONS ###########################################
+def quoteIdentifier(name:str) -> str:
+	'''
+	Quotes a CSV header so it can be used as a SQLite column name
+	'''
+	return('"' + str(name).replace('"', '""') + '"')
+
+### CLASSES ###########################################
+
+class CSVIndex():
+	'''
+	SQLite sidecar (<csv_path>.idx) that holds the rows of a CSV with a B-tree index per searched header
+	Point lookups and updates are O(log n) instead of a full CSV parse and rewrite
+	The index is rebuilt from the CSV with one streaming pass whenever the CSV changed outside of it - checked
+	when it is opened and again (one stat) before every lookup, see refresh()
+	Updates only touch the index, flushToCSV() writes them back out to the CSV
+	'''
+	def __init__(self, csv_path:str, debug=False):
+		self.csv_path = csv_path
+		self.index_path = csv_path + '.idx'
+		self.debug = debug
+		self.header = []
+		self.indexed_headers = set()
+		self.conn = sqlite3.connect(self.index_path)
+		self.conn.execute("PRAGMA journal_mode=WAL")
+		self.conn.execute("PRAGMA synchronous=NORMAL")
+		self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+		self.syncFromCSV()
+
+	def getMeta(self, key:str, default=''):
+		row = self.conn.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+		return(row[0] if row else default)
+
+	def setMeta(self, key:str, value):
+		self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+	def csvSignature(self) -> str:
+		try:
+			stat = os.stat(self.csv_path)
+			return(str(stat.st_size) + ':' + str(stat.st_mtime_ns))
+		except OSError:
+			return('')
+
+	def loadHeader(self):
+		columns = self.conn.execute("PRAGMA table_info(rows)").fetchall()
+		self.header = [c[1] for c in columns if not c[1] == 'row_id']
+		self.indexed_headers = set(r[0][4:] for r in self.conn.execute("SELECT name FROM sqlite_master WHERE type='index' AND name LIKE 'idx_%'"))
+
+	def syncFromCSV(self):
+		'''
+		Rebuilds the index from the CSV if the CSV was changed by something other than this index
+		'''
+		self.loadHeader()
+		if self.getMeta('csv_signature') == self.csvSignature() and self.header:
+			return
+		if self.getMeta('csv_dirty') == '1':
+			print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + self.index_path + "): CSV changed while index had unflushed updates, rebuilding from CSV -")
+		if self.debug:
+			print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + self.index_path + "): Building index from " + self.csv_path + " -")
+		self.conn.execute("DROP TABLE IF EXISTS rows")
+		self.header = []
+		self.indexed_headers = set()
+		if os.path.exists(self.csv_path):
+			with open(self.csv_path, 'r', newline='') as csv_file:
+				reader = csv.reader(csv_file)
+				header = next(reader, None)
+				if header:
+					self.createTable(header)
+					self.insertRows(reader)
+		self.setMeta('csv_dirty', 0)
+		self.setMeta('csv_signature', self.csvSignature())
+		self.conn.commit()
+
+	def refresh(self):
+		'''
+		Picks up changes made to the CSV by another writer since the last sync (i.e. appended rows)
+		'''
+		if not self.getMeta('csv_signature') == self.csvSignature():
+			self.syncFromCSV()
+
+	def createTable(self, header:list):
+		self.conn.execute("CREATE TABLE rows (row_id INTEGER PRIMARY KEY, " + ", ".join(quoteIdentifier(h) + " TEXT" for h in header) + ")")
+		self.header = [str(h) for h in header]
+
+	def insertRows(self, rows):
+		width = len(self.header)
+		sql = "INSERT INTO rows (" + ", ".join(quoteIdentifier(h) for h in self.header) + ") VALUES (" + ", ".join("?" * width) + ")"
+		self.conn.executemany(sql, ( [str(v) for v in (list(r) + [''] * width)[:width]] for r in rows ))
+
+	def ensureIndex(self, header:str):
+		if header in self.indexed_headers:
+			return
+		self.conn.execute("CREATE INDEX IF NOT EXISTS " + quoteIdentifier('idx_' + header) + " ON rows (" + quoteIdentifier(header) + ")")
+		self.indexed_headers.add(header)
+
+	def ensureColumn(self, header:str):
+		if header in self.header:
+			return
+		self.conn.execute("ALTER TABLE rows ADD COLUMN " + quoteIdentifier(header) + " TEXT DEFAULT ''")
+		self.header.append(header)
+
+	def appendRows(self, csv_rows:list, header_row=[]):
+		'''
+		Mirrors rows just appended to the CSV by CSVFile.writeLinesToCSV
+		'''
+		if not self.header:
+			if not header_row:
+				return
+			self.createTable(header_row)
+		self.insertRows(csv_rows)
+		self.setMeta('csv_signature', self.csvSignature())
+		self.conn.commit()
+
+	def updateCell(self, header_to_search_under:str, value_to_search:str, header_to_update:str, value_to_write:str) -> bool:
+		'''
+		Updates the first row where header_to_search_under == value_to_search
+		Returns False if no row matched
+		'''
+		if not header_to_search_under in self.header:
+			return(False)
+		self.ensureIndex(header_to_search_under)
+		self.ensureColumn(header_to_update)
+		row = self.conn.execute("SELECT row_id FROM rows WHERE " + quoteIdentifier(header_to_search_under) + "=? ORDER BY row_id LIMIT 1", (value_to_search,)).fetchone()
+		if not row:
+			return(False)
+		self.conn.execute("UPDATE rows SET " + quoteIdentifier(header_to_update) + "=? WHERE row_id=?", (value_to_write, row[0]))
+		self.setMeta('csv_dirty', 1)
+		return(True)
+
+	def commit(self):
+		self.conn.commit()
+
+	def rollback(self):
+		self.conn.rollback()
+
+	def getValues(self, header_to_search_under:str, value_to_search:str, header_to_return:str) -> list:
+		self.refresh()
+		if not header_to_search_under in self.header or not header_to_return in self.header:
+			raise KeyError(header_to_search_under if not header_to_search_under in self.header else header_to_return)
+		self.ensureIndex(header_to_search_under)
+		return([r[0] for r in self.conn.execute("SELECT " + quoteIdentifier(header_to_return) + " FROM rows WHERE " + quoteIdentifier(header_to_search_under) + "=? ORDER BY row_id", (str(value_to_search),))])
+
+	def rowsContaining(self, header_to_search_under:str, value_to_search:str) -> list:
+		'''
+		Substring match (like pandas str.contains) - this is a scan of the column, not an index lookup
+		'''
+		self.refresh()
+		if not header_to_search_under in self.header:
+			raise KeyError(header_to_search_under)
+		sql = "SELECT " + ", ".join(quoteIdentifier(h) for h in self.header) + " FROM rows WHERE instr(" + quoteIdentifier(header_to_search_under) + ", ?) > 0 ORDER BY row_id"
+		return([list(r) for r in self.conn.execute(sql, (str(value_to_search),))])
+
+	def flushToCSV(self) -> bool:
+		'''
+		Writes updates made through the index back out to the CSV (one sequential write)
+		'''
+		if not self.getMeta('csv_dirty') == '1':
+			return(False)
+		tmp_path = self.csv_path + '.tmp'
+		with open(tmp_path, 'w', newline='') as csv_file:
+			writer = csv.writer(csv_file)
+			writer.writerow(self.header)
+			writer.writerows(self.conn.execute("SELECT " + ", ".join(quoteIdentifier(h) for h in self.header) + " FROM rows ORDER BY row_id"))
+		os.replace(tmp_path, self.csv_path)
+		self.setMeta('csv_dirty', 0)
+		self.setMeta('csv_signature', self.csvSignature())
+		self.conn.commit()
+		return(True)
+
+	def close(self):
+		self.conn.close()
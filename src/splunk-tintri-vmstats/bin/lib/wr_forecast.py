@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+##############################################################################################################
+# Contact: Will Rivendell
+# 	E1: wrivendell@splunk.com
+# 	E2: contact@willrivendell.com
+##############################################################################################################
+
+### IMPORTS ###########################################
+import math
+
+### GLOBALS ###########################################
+DEFAULT_HALF_LIFE_DAYS = 7
+MIN_SPAN_DAYS = 1 / 24 # no slope until the samples span at least an hour
+
+### CLASSES ###########################################
+
+class CapacityForecaster():
+	'''
+	Exponentially weighted least squares fit of used space over time, updated in O(1) per sample
+	All that is kept is a handful of decayed sums (weight, t, y, t*t, t*y) with t in days since the first sample,
+	so the state round trips through a small JSON dict (see state / from the constructor)
+	Older samples fade with the given half life, so the slope follows the recent growth trend, not the all time one
+	'''
+	def __init__(self, state=None, half_life_days=DEFAULT_HALF_LIFE_DAYS):
+		self.half_life_days = max(float(half_life_days), 0.01)
+		self.state = dict(state or {})
+
+	def update(self, sample_time:float, used_gib:float, free_gib:float) -> dict:
+		'''
+		Folds in one sample (sample_time in epoch seconds), returns growth_gib_per_day and days_until_full
+		(either left out while there is not enough history to tell, days_until_full also while space is not growing)
+		'''
+		s = self.state
+		if not s.get('t0'):
+			s.update({'t0': sample_time, 'last': 0.0, 'first': 0.0, 'w': 0.0, 'st': 0.0, 'sy': 0.0, 'stt': 0.0, 'sty': 0.0})
+		t = (sample_time - s['t0']) / 86400
+		if t < s['last']:
+			return(self.forecast(free_gib)) # out of order sample, the fit has moved on already
+		decay = math.pow(0.5, (t - s['last']) / self.half_life_days)
+		for key in ('w', 'st', 'sy', 'stt', 'sty'):
+			s[key] *= decay
+		s['w'] += 1
+		s['st'] += t
+		s['sy'] += used_gib
+		s['stt'] += t * t
+		s['sty'] += t * used_gib
+		s['last'] = t
+		return(self.forecast(free_gib))
+
+	def slope(self):
+		'''
+		GiB per day, None while the samples are too close together in time to fit a line
+		'''
+		s = self.state
+		if not s.get('t0') or s['last'] - s['first'] < MIN_SPAN_DAYS:
+			return(None)
+		denominator = s['w'] * s['stt'] - s['st'] * s['st']
+		if denominator <= 1e-12:
+			return(None)
+		return((s['w'] * s['sty'] - s['st'] * s['sy']) / denominator)
+
+	def forecast(self, free_gib:float) -> dict:
+		growth = self.slope()
+		if growth is None:
+			return({})
+		fields = {'growth_gib_per_day': round(growth, 4)}
+		if growth > 0:
+			fields['days_until_full'] = round(max(free_gib, 0) / growth, 2)
+		return(fields)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+##############################################################################################################
+# Contact: Will Rivendell
+# 	E1: wrivendell@splunk.com
+# 	E2: contact@willrivendell.com
+##############################################################################################################
+
+### IMPORTS ###########################################
+import os, sqlite3, sys, time
+
+from lib import wr_logging as log
+from lib import wr_state as state
+
+### GLOBALS ###########################################
+# capacity series kept per device, all GiB
+HISTORY_FIELDS = (
+	'physical_space_gib',
+	'physical_used_gib',
+	'physical_free_gib',
+	'logical_space_gib',
+	'logical_used_gib',
+	'logical_free_gib',
+	'snapshot_space_gib',
+)
+TREND_DAYS = (1, 7, 30) # spans trends() reports the change over
+TREND_COVERAGE = 0.9 # a span only counts if the history reaches back at least this much of it
+
+### CLASSES ###########################################
+
+class DeviceHistory():
+	'''
+	Local capacity time series of one device: <history_folder>/<device>.history, a SQLite table keyed (and so
+	B-tree indexed) by sample time with one REAL column per HISTORY_FIELDS entry
+	Lets trends (growth, days until full ...) be worked out at collection time with an indexed range read
+	instead of searching months of vmstats.csv or the Splunk index
+	'''
+	def __init__(self, server_name:str, history_folder='./state/', debug=False):
+		self.server_name = server_name
+		self.history_folder = log.normalizePathOS(str(history_folder))
+		os.makedirs(self.history_folder, exist_ok=True)
+		self.history_path = os.path.join(self.history_folder, state.safeFileName(server_name) + '.history')
+		self.debug = debug
+		self.conn = sqlite3.connect(self.history_path)
+		self.conn.execute("PRAGMA journal_mode=WAL")
+		self.conn.execute("PRAGMA synchronous=NORMAL")
+		self.conn.execute("CREATE TABLE IF NOT EXISTS samples (time REAL PRIMARY KEY, " + ", ".join(field + " REAL" for field in HISTORY_FIELDS) + ") WITHOUT ROWID")
+
+	def record(self, sample_time:float, values:dict):
+		'''
+		Adds (or replaces, same time) one sample, fields missing from values are stored as NULL
+		'''
+		self.conn.execute("INSERT OR REPLACE INTO samples (time, " + ", ".join(HISTORY_FIELDS) + ") VALUES (?" + ", ?" * len(HISTORY_FIELDS) + ")", [sample_time] + [values.get(field) for field in HISTORY_FIELDS])
+		self.conn.commit()
+
+	def rowToDict(self, row) -> dict:
+		if row is None:
+			return(None)
+		return(dict(zip(('time',) + HISTORY_FIELDS, row)))
+
+	def latest(self, before=None) -> dict:
+		'''
+		Newest sample (strictly before the given time if one is given), None if there is none
+		'''
+		if before is None:
+			row = self.conn.execute("SELECT * FROM samples ORDER BY time DESC LIMIT 1").fetchone()
+		else:
+			row = self.conn.execute("SELECT * FROM samples WHERE time < ? ORDER BY time DESC LIMIT 1", (before,)).fetchone()
+		return(self.rowToDict(row))
+
+	def nearest(self, at:float) -> dict:
+		'''
+		Oldest sample at or after the given time, i.e. "what was it N days ago"
+		'''
+		return(self.rowToDict(self.conn.execute("SELECT * FROM samples WHERE time >= ? ORDER BY time LIMIT 1", (at,)).fetchone()))
+
+	def iterRange(self, start:float, end=None):
+		'''
+		Yields the samples from start up to (not including) end, oldest first, straight off the index
+		'''
+		end = end if end is not None else float('inf')
+		for row in self.conn.execute("SELECT * FROM samples WHERE time >= ? AND time < ? ORDER BY time", (start, end)):
+			yield(self.rowToDict(row))
+
+	def trends(self, sample_time:float, fields=('physical_used_gib',), days=TREND_DAYS) -> dict:
+		'''
+		Change of each field over the last N days, <field without _gib>_change_<N>d_gib, sample_time's sample minus
+		the oldest one inside the span - one index seek per span, spans the history doesn't cover yet are left out
+		'''
+		current = self.nearest(sample_time)
+		if current is None:
+			return({})
+		changes = {}
+		for span in days:
+			span_start = sample_time - span * 86400
+			then = self.nearest(span_start)
+			if then is None or then['time'] >= sample_time or then['time'] - span_start > span * 86400 * (1 - TREND_COVERAGE):
+				continue
+			for field in fields:
+				if current.get(field) is None or then.get(field) is None:
+					continue
+				name = field[:-4] if field.endswith('_gib') else field
+				changes[name + '_change_' + str(span) + 'd_gib'] = round(current[field] - then[field], 3)
+		return(changes)
+
+	def __len__(self) -> int:
+		return(self.conn.execute("SELECT COUNT(*) FROM samples").fetchone()[0])
+
+	def prune(self, retain_days:float) -> int:
+		'''
+		Drops samples older than retain_days, returns how many went
+		'''
+		removed = self.conn.execute("DELETE FROM samples WHERE time < ?", (time.time() - retain_days * 86400,)).rowcount
+		self.conn.commit()
+		if self.debug and removed:
+			print("- WRHistory(" + str(sys._getframe().f_lineno) +") (" + self.history_path + "): pruned " + str(removed) + " samples -")
+		return(removed)
+
+	def close(self):
+		self.conn.close()
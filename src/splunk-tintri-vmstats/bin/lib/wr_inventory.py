@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+##############################################################################################################
+# Contact: Will Rivendell
+# 	E1: wrivendell@splunk.com
+# 	E2: contact@willrivendell.com
+##############################################################################################################
+
+### IMPORTS ###########################################
+import time
+
+from lib import wr_tintri as tintri
+from lib import wr_snapshots as snapshots
+
+### FUNCTIONS ###########################################
+def virtualDiskFields(disk:dict) -> tuple:
+	'''
+	(vm_uuid, disk_name, space_used_gib) out of one /virtualDisk item, space_used_gib is None if missing
+	The space figure is read from the item itself or from its latest sortedStats entry, whichever the appliance sent
+	'''
+	vm_uuid = (disk.get('vmUuid') or {}).get('uuid', '')
+	space_used = disk.get('spaceUsedGiB')
+	if space_used is None:
+		sorted_stats = (disk.get('stat') or {}).get('sortedStats') or []
+		if sorted_stats:
+			space_used = sorted_stats[-1].get('spaceUsedGiB')
+	try:
+		space_used = float(space_used)
+	except (TypeError, ValueError):
+		space_used = None
+	return(vm_uuid, disk.get('name', ''), space_used)
+
+### CLASSES ###########################################
+
+class InventoryIndex():
+	'''
+	Per device inventory keyed by VM uuid, filled from one streamed pass over each of /vm, /virtualDisk and /snapshot
+	Disks and snapshots are joined to their VM with a dict lookup as they stream in, so no per VM requests
+	and no scanning of the disk list per VM are needed
+	Per VM only the compact vmStats() dict, a disk count / space / name list and one LatestSnapshotIndex slot are kept
+	Items pointing at a VM uuid the /vm list did not have are counted as orphans
+	'''
+	def __init__(self):
+		self.vms = {} # vm_uuid -> wr_tintri.vmStats() dict
+		self.disks = {} # vm_uuid -> [disk_count, space_used_gib, [disk names]]
+		self.snapshot_index = snapshots.LatestSnapshotIndex()
+		self.disk_total = 0
+
+	def addVM(self, vm:dict):
+		vm_stats = tintri.vmStats(vm)
+		self.vms[vm_stats['vm_uuid']] = vm_stats
+
+	def addVirtualDisk(self, disk:dict):
+		vm_uuid, disk_name, space_used = virtualDiskFields(disk)
+		self.disk_total += 1
+		slot = self.disks.get(vm_uuid)
+		if slot is None:
+			slot = self.disks[vm_uuid] = [0, 0.0, []]
+		slot[0] += 1
+		if space_used is not None:
+			slot[1] += space_used
+		if disk_name:
+			slot[2].append(disk_name)
+
+	def addSnapshot(self, snapshot:dict):
+		self.snapshot_index.addSnapshot(snapshot)
+
+	def __len__(self) -> int:
+		return(len(self.vms))
+
+	def orphans(self) -> dict:
+		'''
+		Disks / snapshots whose VM uuid is not in the VM list (VM deleted mid walk, or templates / replicas the list skips)
+		'''
+		return({
+			'orphan_disk_vms': sum(1 for vm_uuid in self.disks if vm_uuid not in self.vms),
+			'orphan_snapshot_vms': sum(1 for vm_uuid in self.snapshot_index.vm_uuids if vm_uuid not in self.vms),
+		})
+
+	def iterEnrichedVMs(self, now=None):
+		'''
+		Yields one joined dict per VM: its stats, disk count / space / names and latest snapshot
+		'''
+		now_ms = (now if now is not None else time.time()) * 1000
+		for vm_uuid, vm_stats in self.vms.items():
+			enriched = dict(vm_stats)
+			disk_slot = self.disks.get(vm_uuid)
+			enriched['disk_count'] = disk_slot[0] if disk_slot else 0
+			if disk_slot:
+				enriched['disk_space_used_gib'] = round(disk_slot[1], 3)
+				enriched['disk_names'] = disk_slot[2]
+			latest = self.snapshot_index.get(vm_uuid)
+			enriched['snapshot_count'] = latest[2] if latest else 0
+			if latest:
+				enriched['latest_snapshot_uuid'] = latest[0]
+				if latest[1]:
+					enriched['latest_snapshot_time'] = latest[1] / 1000
+					enriched['latest_snapshot_age_hours'] = round((now_ms - latest[1]) / 3600000, 3)
+			yield(enriched)
+
+	def deviceStats(self) -> dict:
+		stats = {
+			'vm_count': len(self.vms),
+			'disk_count': self.disk_total,
+			'snapshot_count': self.snapshot_index.total_snapshots,
+			'vms_without_disks': sum(1 for vm_uuid in self.vms if vm_uuid not in self.disks),
+			'vms_without_snapshots': sum(1 for vm_uuid in self.vms if self.snapshot_index.get(vm_uuid) is None),
+		}
+		stats.update(self.orphans())
+		return(stats)
@@ -6,9 +6,15 @@
 ##############################################################################################################
 
 ### IMPORTS ###########################################
-import os, time, datetime, csv, pandas, sys
+import os, io, time, datetime, csv, json, gzip, shutil, threading, collections, atexit, sys
 
-from pathlib import Path
+### GLOBALS ###########################################
+RETENTION_MANIFEST = '.wr_retention.json' # per log folder record of when each log was last cleaned up
+rotation_generations = {} # log path -> next rotation generation number, learned on first rotation
+compress_threads = [] # background gzip of rotated logs
+pandas = None # only imported by the csv query methods, see loadPandas() - False if it is not installed
+frame_cache = collections.OrderedDict() # csv path -> [signature, DataFrame, bytes], least recently used first
+frame_cache_max_bytes = 256000000 # memory cap across all cached CSVs, see setFrameCacheLimit()
 
 ### FUNCTIONS ###########################################
 # pass any path in here, windows or linux and normalize it to whatever OS the script is running on
@@ -35,31 +41,241 @@ def verifyLogFileExist(log_file):
 	else:
 		return(False)
 
-# after 50mb create a new log file and append number at the end
-def checkFileSize(log_file: str, roll_size_bytes=100000000, max_files_to_keep=0, debug=False) -> bool:
+def listRotatedGenerations(log_file:str) -> dict:
 	'''
-	Checks if current log is greater than bytes and creates a new by appending number to end
-	Will delete any logs greater than max_files_to_keep unless 0 which is keep all
+	One listing of the log's folder
+	Returns a dict of {generation_number: path} for every rotated generation of log_file (<log_file>_N or <log_file>_N.gz)
 	'''
-	if os.path.exists(log_file):
-		if os.path.getsize(log_file) >= roll_size_bytes:
-			counter = 0
-			if debug:
-				print("- WRLog(" + str(sys._getframe().f_lineno) + "): File to be rotated / removed: {}".format(log_file))
-			while os.path.exists((log_file) + "_" + str(counter)):
-				counter = (counter) + 1
-			else:
-				os.rename( (log_file), (log_file) + "_" + str(counter) )
-			if not max_files_to_keep == 0: # check if file need deletion after each new made
-				log_dir = Path(log_file).parent
-				path, dirs, files = next(os.walk(log_dir))
-				num_logs = len(files)
-				while num_logs > max_files_to_keep: # remove oldest log files until at specified keep amount
-					path, dirs, files = next(os.walk(log_dir))
-					num_logs = len(files)
-					for file in files:
-						oldest_file = min(log_dir + '/' + file, key=os.path.getctime)
-						os.remove(oldest_file)
+	log_dir = os.path.dirname(log_file) or '.'
+	prefix = os.path.basename(log_file) + "_"
+	generations = {}
+	try:
+		for f in os.scandir(log_dir):
+			if not f.name.startswith(prefix):
+				continue
+			number = f.name[len(prefix):]
+			if number.endswith('.gz'):
+				number = number[:-3]
+			if number.isdigit():
+				generations[int(number)] = f.path
+	except OSError:
+		pass
+	return(generations)
+
+def compressFile(file_path:str, debug=False):
+	'''
+	gzips file_path to file_path.gz and removes the original
+	'''
+	try:
+		with open(file_path, 'rb') as f_in, gzip.open(file_path + '.gz.tmp', 'wb') as f_out:
+			shutil.copyfileobj(f_in, f_out)
+		os.replace(file_path + '.gz.tmp', file_path + '.gz')
+		os.remove(file_path)
+		if debug:
+			print("- WRLog(" + str(sys._getframe().f_lineno) + "): Compressed rotated log: {}".format(file_path))
+	except Exception as ex:
+		print("- WRLog(" + str(sys._getframe().f_lineno) + "): Could not compress rotated log " + file_path + ": " + str(ex) + " -")
+
+# after roll_size_bytes rename the log to the next generation number and start a fresh one
+def checkFileSize(log_file: str, roll_size_bytes=100000000, max_files_to_keep=0, compress=False, debug=False) -> bool:
+	'''
+	Checks if current log is greater than bytes and rotates it to <log_file>_N, N being the next generation
+	The current generation is tracked per log so rotation is a single rename, the folder is only listed
+	the first time a log rotates and when pruning
+	Will delete the oldest rotated logs beyond max_files_to_keep unless 0 which is keep all
+	Optionally gzips the rotated generation in a background thread
+	Returns True if the log was rotated
+	'''
+	try:
+		if os.path.getsize(log_file) < roll_size_bytes:
+			return(False)
+	except OSError:
+		return(False)
+	if debug:
+		print("- WRLog(" + str(sys._getframe().f_lineno) + "): File to be rotated / removed: {}".format(log_file))
+	generations = None
+	if log_file not in rotation_generations:
+		generations = listRotatedGenerations(log_file)
+		rotation_generations[log_file] = max(generations) + 1 if generations else 0
+	counter = rotation_generations[log_file]
+	rotated_file = (log_file) + "_" + str(counter)
+	try:
+		os.rename( (log_file), rotated_file )
+	except OSError as ex:
+		print("- WRLog(" + str(sys._getframe().f_lineno) + "): Could not rotate " + log_file + ": " + str(ex) + " -")
+		rotation_generations.pop(log_file, None) # re-learn the generation next time
+		return(False)
+	rotation_generations[log_file] = counter + 1
+	if compress:
+		compress_thread = threading.Thread(target=compressFile, args=(rotated_file, debug), name="wrlog_compress", daemon=False)
+		compress_thread.file_path = rotated_file
+		compress_thread.start()
+		compress_threads[:] = [t for t in compress_threads if t.is_alive()]
+		compress_threads.append(compress_thread)
+	if not max_files_to_keep == 0: # remove oldest generations until at specified keep amount
+		if generations is None:
+			generations = listRotatedGenerations(log_file)
+		generations[counter] = rotated_file
+		compressing = set(t.file_path for t in compress_threads if t.is_alive())
+		for number in sorted(generations)[:-max_files_to_keep]:
+			if generations[number] in compressing:
+				continue # still being gzipped, removed (as .gz) on the next rotation
+			for old_file in (generations[number], generations[number] + '.gz'):
+				if os.path.exists(old_file):
+					try:
+						os.remove(old_file)
+						if debug:
+							print("- WRLog(" + str(sys._getframe().f_lineno) + "): Removed old rotated log: {}".format(old_file))
+					except OSError:
+						print("- WRLog(" + str(sys._getframe().f_lineno) + "): " + old_file + " could not be deleted, permissions? -")
+	return(True)
+
+def waitForCompression(timeout=None):
+	'''
+	Blocks until background compression of rotated logs has finished
+	'''
+	while compress_threads:
+		compress_threads.pop().join(timeout)
+
+def loadPandas():
+	'''
+	Imports pandas on first use so writing logs / csvs never pays for it
+	Returns the module, or None if pandas is not installed (the stdlib csv fallbacks are used then)
+	'''
+	global pandas
+	if pandas is None:
+		try:
+			import pandas as pandas_module
+			pandas = pandas_module
+		except ImportError:
+			pandas = False
+	return(pandas or None)
+
+def readCSVRows(file_path:str) -> tuple:
+	'''
+	stdlib csv read of a whole file, returns (header, rows)
+	'''
+	with open(file_path, 'r', newline='') as csv_file:
+		reader = csv.reader(csv_file)
+		header = next(reader, [])
+		return(header, [row for row in reader])
+
+def csvUpdateCells(file_path:str, parameter_list:list, log_name:str) -> bool:
+	'''
+	stdlib version of CSVFile.updateCellsByHeader for when pandas is not installed
+	All updates are applied in memory, the file is only rewritten if every one of them found its row
+	'''
+	header, rows = readCSVRows(file_path)
+	for i in parameter_list:
+		if not len(i) == 4:
+			print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + log_name + "): - updateCellsByHeader takes strictly 4 parameters more or less given. Skipping: " + str(i) +" -")
+			continue
+		search_column = header.index(str(i[0]))
+		if not str(i[2]) in header:
+			header.append(str(i[2]))
+		update_column = header.index(str(i[2]))
+		row = next(r for r in rows if search_column < len(r) and r[search_column] == str(i[1])) # StopIteration if not found
+		row.extend([''] * (len(header) - len(row)))
+		row[update_column] = str(i[3])
+	tmp_path = file_path + '.tmp'
+	with open(tmp_path, 'w', newline='') as csv_file:
+		writer = csv.writer(csv_file)
+		writer.writerow(header)
+		writer.writerows(row + [''] * (len(header) - len(row)) for row in rows)
+	os.replace(tmp_path, file_path)
+	return(True)
+
+def csvGetValues(file_path:str, header_to_search_under:str, value_to_search:str, header_to_return:str) -> list:
+	'''
+	stdlib version of CSVFile.getValueByHeaders, streams the file and returns the matching values as strings
+	'''
+	with open(file_path, 'r', newline='') as csv_file:
+		reader = csv.reader(csv_file)
+		header = next(reader, [])
+		search_column = header.index(header_to_search_under)
+		return_column = header.index(header_to_return)
+		return([row[return_column] if return_column < len(row) else '' for row in reader if search_column < len(row) and row[search_column] == str(value_to_search)])
+
+def csvRowsContaining(file_path:str, header_to_search_under:str, value_to_search:str) -> list:
+	'''
+	stdlib version of CSVFile.valueExistsInColumn, returns the rows (as lists) whose column contains value_to_search
+	'''
+	with open(file_path, 'r', newline='') as csv_file:
+		reader = csv.reader(csv_file)
+		header = next(reader, [])
+		search_column = header.index(header_to_search_under)
+		return([row for row in reader if search_column < len(row) and str(value_to_search) in row[search_column]])
+
+def csvSignature(file_path:str) -> tuple:
+	'''
+	(size, mtime) of a file, used to tell if a cached read of it is still valid
+	'''
+	try:
+		stat = os.stat(file_path)
+		return((stat.st_size, stat.st_mtime_ns))
+	except OSError:
+		return(None)
+
+def setFrameCacheLimit(max_bytes:int):
+	'''
+	Sets the memory cap for cached CSV DataFrames, 0 disables the cache
+	'''
+	global frame_cache_max_bytes
+	frame_cache_max_bytes = max_bytes
+	trimFrameCache()
+
+def trimFrameCache():
+	total = sum(entry[2] for entry in frame_cache.values())
+	while frame_cache and total > frame_cache_max_bytes:
+		path, entry = frame_cache.popitem(last=False) # evict least recently used
+		total -= entry[2]
+
+def cacheFrame(file_path:str, df, nbytes=None):
+	if nbytes is None:
+		nbytes = int(df.memory_usage(deep=True).sum())
+	frame_cache[file_path] = [csvSignature(file_path), df, nbytes]
+	frame_cache.move_to_end(file_path)
+	trimFrameCache()
+
+def readCSVFrame(file_path:str):
+	'''
+	pandas.read_csv with an in-process cache keyed by path
+	The cached frame is only used while the file's size and mtime are unchanged
+	Callers must not modify the returned frame unless they re-cache or evict it
+	'''
+	entry = frame_cache.get(file_path)
+	if entry and entry[0] == csvSignature(file_path):
+		frame_cache.move_to_end(file_path)
+		return(entry[1])
+	frame_cache.pop(file_path, None)
+	df = loadPandas().read_csv(file_path)
+	cacheFrame(file_path, df)
+	return(df)
+
+def appendToCachedFrame(file_path:str, signature_before_write:tuple, csv_rows:list):
+	'''
+	Appends rows just written to the CSV onto its cached frame instead of throwing the cache away
+	If pandas infers a different dtype for any column of the new rows than the cached frame has (i.e. "abc" appended
+	to a column of ints), a fresh read of the whole file would infer differently too, so the cache is dropped instead
+	'''
+	entry = frame_cache.get(file_path)
+	if not entry:
+		return
+	if not entry[0] == signature_before_write or not csv_rows:
+		frame_cache.pop(file_path, None)
+		return
+	try:
+		buffer = io.StringIO()
+		csv.writer(buffer).writerows(csv_rows)
+		buffer.seek(0)
+		new_rows = pandas.read_csv(buffer, header=None, names=list(entry[1].columns))
+		if not list(new_rows.dtypes) == list(entry[1].dtypes):
+			frame_cache.pop(file_path, None)
+			return
+		df = pandas.concat([entry[1], new_rows], ignore_index=True)
+		cacheFrame(file_path, df, entry[2] + int(new_rows.memory_usage(deep=True).sum()))
+	except Exception:
+		frame_cache.pop(file_path, None)
 
 def isLogFileOld(file, log_retention_days):
 	""" Determines if a log file is dictated to be 'old' - (I.e. if the log file is older then the retention period)
@@ -73,42 +289,104 @@ def isLogFileOld(file, log_retention_days):
 	else:
 		return False
 
-def removeOldLogFiles(class_name:str, log_folder:str, log_file:str, log_retention_days:int):
+def splitDatePrefix(file_name:str) -> tuple:
+	'''
+	Splits a '%Y_%m_%d_' prefixed file name into its date string and the rest of the name
+	Returns (date_string, name) or ('', file_name) if there is no valid date prefix
+	'''
+	date_part = file_name[:10]
+	if len(file_name) > 11 and file_name[10] == '_':
+		try:
+			datetime.datetime.strptime(date_part, "%Y_%m_%d")
+			return(date_part, file_name[11:])
+		except ValueError:
+			pass
+	return('', file_name)
+
+def readRetentionManifest(manifest_path:str) -> dict:
+	'''
+	Reads the small retention manifest kept in each log folder
+	Returns an empty dict if it does not exist yet or cannot be read
+	'''
+	try:
+		with open(manifest_path, 'r') as manifest:
+			return(json.load(manifest))
+	except Exception:
+		return({})
+
+def writeRetentionManifest(manifest_path:str, manifest_data:dict):
+	try:
+		tmp_path = manifest_path + '.tmp'
+		with open(tmp_path, 'w') as manifest:
+			json.dump(manifest_data, manifest)
+		os.replace(tmp_path, manifest_path)
+	except Exception as ex:
+		print("- WRLog(" + str(sys._getframe().f_lineno) +"): Could not write retention manifest " + manifest_path + ": " + str(ex) + " -")
+
+def removeOldLogFiles(class_name:str, log_folder:str, log_file:str, log_retention_days:int, check_interval_seconds=3600, debug=False):
 	"""
-	Removes all Log Files in that are older then a certain date
+	Removes all generations of a log file that are older than the retention period
+	Relies on the '%Y_%m_%d_' date prefix of the file names rather than file mtimes, so nothing is stat-ed
+	log_folder is walked recursively, as before, so generations in sub folders are removed too
+	A small manifest in log_folder records when each log was last checked and its oldest kept date, so
+	the folder is listed at most once per check_interval_seconds and not at all if nothing can have expired
+	log_retention_days of 0 removes every generation of this log on every call, the interval does not apply
 	Must be called manually
 	"""
-	# fetch list of every file in (log_folder)
-	all_files_list = [os.path.join(dp, f) for dp, dn, fn in os.walk(os.path.expanduser( (log_folder) )) for f in fn]
-	if all_files_list:
-		print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + class_name + "): Log files Found: -")
-		for f in all_files_list:
-			if str(log_file) in f:
-				print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + class_name + "): " + f + " -") 
 	if not os.path.exists(log_folder):
 		print("-" + (log_folder)+" does not exist or couldn't be accessed, will attempt to create -")
-	if not all_files_list:
-		print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + class_name + "): No old logs found for removal in " + class_name + " -")
 		return
-	print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + class_name + "): Removing old log files -")
-	for f in all_files_list:
-		any_old_found = False
-		if str(log_file) in f:
-			if isLogFileOld(f, log_retention_days) or log_retention_days == 0:
-				any_old_found = True
-				try:
-					os.remove(f)
-					print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + class_name + "): " + (f) + " deleted -")
-				except:
-					print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + class_name + "): " +  (f) + " could not be deleted, permissions? -")
-		if not any_old_found:
-			if str(log_file) in f:
-				print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + class_name + "): No (more) logs older than " + str(log_retention_days) + " days found. -")
+	date_part, base_name = splitDatePrefix(os.path.basename(log_file))
+	manifest_path = os.path.join(log_folder, RETENTION_MANIFEST)
+	manifest_data = readRetentionManifest(manifest_path)
+	entry = manifest_data.get(base_name, {})
+	now = time.time()
+	today = datetime.datetime.now().strftime("%Y_%m_%d")
+	cutoff = (datetime.datetime.now() - datetime.timedelta(days=(log_retention_days or 0))).strftime("%Y_%m_%d")
+
+	# skip if checked recently, or if the oldest generation we know about has not expired yet
+	if log_retention_days and now - entry.get('last_run', 0) < check_interval_seconds:
+		if debug:
+			print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + class_name + "): Retention already checked in the last " + str(check_interval_seconds) + "s, skipping -")
+		return
+	if log_retention_days and entry.get('oldest', '') >= cutoff:
+		if debug:
+			print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + class_name + "): No logs older than " + str(log_retention_days) + " days possible, skipping -")
+		manifest_data[base_name] = {'last_run': now, 'oldest': entry['oldest']}
+		writeRetentionManifest(manifest_path, manifest_data)
+		return
+
+	# one walk of the folder, names only
+	oldest_kept = today
+	removed = 0
+	entries = [(f, os.path.join(dp, f)) for dp, dn, fn in os.walk(log_folder) for f in fn]
+	for f, f_path in entries:
+		f_date, f_name = splitDatePrefix(f)
+		if not f_date or not f_name.startswith(base_name):
+			continue
+		# rotated generations are <name>_<n> (optionally compressed), sidecars are <name>.<ext> (i.e. the csv index)
+		if f_name != base_name and not f_name[len(base_name):][:1] in ('_', '.'):
+			continue
+		if not log_retention_days or f_date < cutoff:
+			try:
+				os.remove(f_path)
+				removed += 1
+				if debug:
+					print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + class_name + "): " + f_path + " deleted -")
+			except OSError:
+				print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + class_name + "): " + f_path + " could not be deleted, permissions? -")
+				oldest_kept = min(oldest_kept, f_date)
+		else:
+			oldest_kept = min(oldest_kept, f_date)
+	if debug:
+		print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + class_name + "): Removed " + str(removed) + " log file(s) older than " + str(log_retention_days) + " days -")
+	manifest_data[base_name] = {'last_run': now, 'oldest': oldest_kept}
+	writeRetentionManifest(manifest_path, manifest_data)
 
 ### CLASSES ###########################################
 
 class LogFile():
-	def __init__(self, name: str, log_folder='./logs/', remove_old_logs=False, log_level=1, log_retention_days=7, roll_size_bytes=50000000, max_files_to_keep=0,  prefix_date=True, debug=False):
+	def __init__(self, name: str, log_folder='./logs/', remove_old_logs=False, log_level=1, log_retention_days=7, roll_size_bytes=50000000, max_files_to_keep=0,  prefix_date=True, compress_rotated=False, debug=False):
 		log_folder = normalizePathOS(str(log_folder))
 		self.name = name # log file name - day will automatically be prefixed
 		self.log_folder = log_folder # folder to write the log to
@@ -116,6 +394,7 @@ class LogFile():
 		self.log_retention_days = log_retention_days
 		self.roll_size_bytes = roll_size_bytes
 		self.max_files_to_keep = max_files_to_keep
+		self.compress_rotated = compress_rotated
 		self.debug = debug
 		# if user specified own extension, dont add .log
 		root, ext = os.path.splitext(self.name)
@@ -135,7 +414,7 @@ class LogFile():
 			except:
 				print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + self.log_file + "): " + (self.log_folder) + ' - could not be accessed or created. Check permissions?')
 		if remove_old_logs:
-			removeOldLogFiles(self.name, self.log_folder, self.log_file, self.log_retention_days)
+			removeOldLogFiles(self.name, self.log_folder, self.log_file, self.log_retention_days, debug=self.debug)
 		self.log_path = (self.log_folder) + '/' + (self.log_file).replace('//','/').replace('\\\\','\\')
 
 	def writeLinesToFile(self, lines: list, level=9, include_break=True):
@@ -158,7 +437,7 @@ class LogFile():
 								file.write("%s" % (prefix) + line)
 					file.close
 					retry = 0
-					checkFileSize(self.log_path, self.roll_size_bytes, self.max_files_to_keep, self.debug)
+					checkFileSize(self.log_path, self.roll_size_bytes, self.max_files_to_keep, self.compress_rotated, self.debug)
 				except Exception as ex:
 					print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + self.log_file + "): Exception: " + str(ex) + " -")
 					if retry > 0:
@@ -175,9 +454,19 @@ class LogFile():
 
 class CSVFile():
 	# this is the startup script, init?
-	def __init__(self, name: str, log_folder='./logs/', remove_old_logs=False, log_retention_days=7, prefix_date=True, debug=False):
+	def __init__(self, name: str, log_folder='./logs/', remove_old_logs=False, log_retention_days=7, prefix_date=True, indexed=False, flush_updates=True, debug=False):
+		'''
+		indexed=True keeps a SQLite index next to the CSV (see wr_csv_index) so the lookup / update methods
+		don't re-read and parse the whole CSV each call
+		Updates still reach the CSV at the end of each updateCellsByHeader batch - flush_updates=False keeps them in
+		the index only until flushIndex(), leaving the with block or interpreter exit, whichever comes first
+		'''
 		log_folder = normalizePathOS(str(log_folder))
 		self.debug = debug
+		self.indexed = indexed
+		self.flush_updates = flush_updates
+		self.flush_at_exit = False
+		self.index = None
 		self.name = name # log file name - day will automatically be prefixed
 		self.log_folder = log_folder # folder to write the log to
 		self.log_retention_days = log_retention_days
@@ -194,7 +483,7 @@ class CSVFile():
 			else:
 				self.log_file = (self.name) + ".csv"
 		if remove_old_logs:
-			removeOldLogFiles(self.name, self.log_folder, self.log_file, self.log_retention_days)
+			removeOldLogFiles(self.name, self.log_folder, self.log_file, self.log_retention_days, debug=self.debug)
 		if not os.path.exists(self.log_folder):
 			try:
 				os.makedirs( (self.log_folder), exist_ok=True)
@@ -202,7 +491,36 @@ class CSVFile():
 				print( (self.log_folder) + ' - could not be accessed or created. Check permissions?')
 		self.log_path = (self.log_folder) + '/' + (self.log_file).replace('//','/').replace('\\\\','\\')
 
+	def getIndex(self):
+		'''
+		Opens (and if needed rebuilds) the SQLite index for this CSV on first use
+		'''
+		if self.index is None:
+			from lib import wr_csv_index
+			self.index = wr_csv_index.CSVIndex(self.log_path, debug=self.debug)
+		return(self.index)
+
+	def flushIndex(self) -> bool:
+		'''
+		Writes any updates made through the index back out to the CSV
+		'''
+		if self.index is None:
+			return(False)
+		return(self.index.flushToCSV())
+
+	def __enter__(self):
+		return(self)
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.flushIndex()
+		if self.index is not None:
+			self.index.close()
+			self.index = None
+
 	def writeLinesToCSV(self, csv_rows: list, header_row=[]):
+		if self.indexed:
+			self.getIndex().refresh() # mirror someone else's appends before ours
+		signature_before_write = csvSignature(self.log_path)
 		if not os.path.exists(self.log_path):
 			write_header = True
 			header_written = False
@@ -223,6 +541,12 @@ class CSVFile():
 						writer.writerow(row)
 				csv_file.close
 				retry = 0
+				if self.indexed:
+					self.index.appendRows(csv_rows, header_row)
+				if write_header:
+					frame_cache.pop(self.log_path, None)
+				else:
+					appendToCachedFrame(self.log_path, signature_before_write, csv_rows)
 			except Exception as ex:
 				print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + self.log_file + "): Exception: + " + str(ex) + " -")
 				if retry > 0:
@@ -240,9 +564,40 @@ class CSVFile():
 		Single mods should be in list format as well. eg
 		['header_to_search_under', 'value_to_search', 'header_to_update', 'value_to_write']
 		'''
-		if os.path.exists(self.log_path):
+		if os.path.exists(self.log_path) and self.indexed:
+			index = self.getIndex()
 			try:
-				df = pandas.read_csv(self.log_path)
+				index.refresh()
+				for i in parameter_list:
+					if not len(i) == 4:
+						print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + self.log_file + "): - updateCellsByHeader takes strictly 4 parameters more or less given. Skipping: " + str(i) +" -")
+						continue
+					if not index.updateCell(str(i[0]), str(i[1]), str(i[2]), str(i[3])):
+						index.rollback()
+						return(False)
+				index.commit()
+			except Exception:
+				index.rollback()
+				return(False)
+			if self.flush_updates:
+				try:
+					index.flushToCSV()
+				except Exception as ex:
+					print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + self.log_file + "): Could not write updates back to the csv, kept in the index: " + str(ex) + " -")
+					return(False)
+				return(True)
+			if not self.flush_at_exit:
+				atexit.register(self.flushIndex)
+				self.flush_at_exit = True
+			return(True)
+		elif os.path.exists(self.log_path) and loadPandas() is None:
+			try:
+				return(csvUpdateCells(self.log_path, parameter_list, self.log_file))
+			except Exception:
+				return(False)
+		elif os.path.exists(self.log_path):
+			try:
+				df = readCSVFrame(self.log_path)
 				for i in parameter_list:
 					if not len(i) == 4:
 						print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + self.log_file + "): - updateCellsByHeader takes strictly 4 parameters more or less given. Skipping: " + str(i) +" -")
@@ -254,9 +609,11 @@ class CSVFile():
 					i = df[ df[header_to_search_under]==value_to_search ].index.values[0] # get row index of the value we search for
 					df.loc[i,header_to_update]=value_to_write
 				df.to_csv(self.log_path, index=False)
+				cacheFrame(self.log_path, df) # the frame is now what is on disk
 				#df.loc[df [ (header_to_search_under) ] == (value_to_search), (header_to_update)] = (value_to_write) #broken
 				return(True)
 			except:
+				frame_cache.pop(self.log_path, None) # frame may be partly modified
 				return(False)
 		else:
 			print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + self.log_file + "): - Could not read csv specified. -")
@@ -267,9 +624,19 @@ class CSVFile():
 		Search by header for a string to find the row.
 		Return the (True, str(<value>)) if found.
 		'''
-		if os.path.exists(self.log_path):
+		if os.path.exists(self.log_path) and self.indexed:
+			try:
+				return(True, self.getIndex().getValues(first_header_to_search_under, value_under_first_header_to_search, second_header_to_search_under))
+			except Exception:
+				return(False, "")
+		elif os.path.exists(self.log_path) and loadPandas() is None:
+			try:
+				return(True, csvGetValues(self.log_path, first_header_to_search_under, value_under_first_header_to_search, second_header_to_search_under))
+			except Exception:
+				return(False, "")
+		elif os.path.exists(self.log_path):
 			try:
-				df = pandas.read_csv(self.log_path)
+				df = readCSVFrame(self.log_path)
 				value = df.loc[df[first_header_to_search_under] == value_under_first_header_to_search, second_header_to_search_under].tolist()
 				return(True, value)
 				#value = df.loc[df['Blob_Path_Name'] == 'frozendata/barracuda/frozendb/db_1621091116_1625030436_62_98B6F435-6FB4-4FE5-8E89-6F7C865A4F9E/rawdata/journal.gz', 'Download_Complete'].tolist()
@@ -282,10 +649,31 @@ class CSVFile():
 	def valueExistsInColumn(self, first_header_to_search_under:str, value_under_first_header_to_search:str) -> list:
 		'''
 		If found, will return True, <list of rows found in>
+		Rows are a DataFrame, or a list of row lists if pandas is not installed
 		'''
-		if os.path.exists(self.log_path):
+		if os.path.exists(self.log_path) and self.indexed:
+			try:
+				index = self.getIndex()
+				rows = index.rowsContaining(first_header_to_search_under, value_under_first_header_to_search)
+				if loadPandas() is None:
+					return(True, rows)
+				# the index holds text, let read_csv type the columns like the non indexed path does
+				buffer = io.StringIO()
+				writer = csv.writer(buffer)
+				writer.writerow(index.header)
+				writer.writerows(rows)
+				buffer.seek(0)
+				return(True, pandas.read_csv(buffer))
+			except Exception:
+				return(False, [])
+		elif os.path.exists(self.log_path) and loadPandas() is None:
+			try:
+				return(True, csvRowsContaining(self.log_path, first_header_to_search_under, value_under_first_header_to_search))
+			except Exception:
+				return(False, [])
+		elif os.path.exists(self.log_path):
 			try:
-				df = pandas.read_csv(self.log_path)
+				df = readCSVFrame(self.log_path)
 				value = df[df[first_header_to_search_under].str.contains(value_under_first_header_to_search)]
 				return(True, value)
 			except:
@@ -294,16 +682,49 @@ class CSVFile():
 			print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + self.log_path + "): - Could not read csv specified. -")
 			return(False, False)
 
+	def iterRowChunks(self, remove_rows_header_equals_value_pairs=[], chunk_size=10000):
+		'''
+		Streams the rows of the csv (header row skipped) as lists of up to chunk_size rows
+		Memory stays constant no matter the size of the csv
+		Optionally specify a list of [header, value] pairs, rows where any header equals its value are left out
+		Headers not in the csv are ignored
+		'''
+		with open(self.log_path, 'r', newline='') as csv_file:
+			reader = csv.reader(csv_file)
+			header = next(reader, None)
+			if header is None:
+				return
+			exclusions = []
+			for pair in remove_rows_header_equals_value_pairs:
+				if pair[0] in header:
+					exclusions.append((header.index(pair[0]), str(pair[1])))
+			chunk = []
+			for row in reader:
+				if exclusions and any(column < len(row) and row[column] == value for column, value in exclusions):
+					continue
+				chunk.append(row)
+				if len(chunk) >= chunk_size:
+					yield(chunk)
+					chunk = []
+			if chunk:
+				yield(chunk)
+
+	def iterRows(self, remove_rows_header_equals_value_pairs=[], chunk_size=10000):
+		'''
+		Same as iterRowChunks() but yields one row at a time
+		'''
+		for chunk in self.iterRowChunks(remove_rows_header_equals_value_pairs, chunk_size):
+			yield from chunk
+
 	def readAllRowsToList(self, remove_rows_header_equals_value_pairs=[]) -> list:
 		'''
 		Reads all of the rows in the csv for this calss to a list 
 		Optionally specify a list of kv pairs, header, value to exclude any rows where that matches in the new list
+		Use iterRows() / iterRowChunks() instead for large csvs
 		'''
 		if os.path.exists(self.log_path):
 			try:
-				df = pandas.read_csv(self.log_path, header=None, engine='python')
-				df = df.iloc[1:]
-				return(df.values.tolist())
+				return(list(self.iterRows(remove_rows_header_equals_value_pairs)))
 			except Exception as ex:
 				print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + self.log_path + "): - Read from CSV failed -")
 				print(ex)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+##############################################################################################################
+# Contact: Will Rivendell
+# 	E1: wrivendell@splunk.com
+# 	E2: contact@willrivendell.com
+##############################################################################################################
+
+### IMPORTS ###########################################
+import os, datetime, sys
+
+try:
+	import pyarrow
+	import pyarrow.parquet
+except ImportError: # optional - ParquetFile.available tells the caller if it can be used
+	pyarrow = None
+
+from lib import wr_logging as log
+
+### GLOBALS ###########################################
+COLUMN_TYPES = ('string', 'float64', 'int64', 'timestamp')
+
+### FUNCTIONS ###########################################
+def isAvailable() -> bool:
+	return(pyarrow is not None)
+
+def convertValue(value, column_type:str):
+	'''
+	Converts the stringified values the collector produces back to the column's type, '' / None become null
+	'''
+	if value is None or value == '':
+		return(None)
+	try:
+		if column_type == 'float64':
+			return(float(value))
+		if column_type == 'int64':
+			return(int(float(value)))
+		if column_type == 'timestamp':
+			if isinstance(value, datetime.datetime):
+				return(value)
+			return(datetime.datetime.fromtimestamp(float(value), tz=datetime.timezone.utc))
+	except (TypeError, ValueError):
+		return(None)
+	return(str(value))
+
+def arrowType(column_type:str):
+	if column_type == 'float64':
+		return(pyarrow.float64())
+	if column_type == 'int64':
+		return(pyarrow.int64())
+	if column_type == 'timestamp':
+		return(pyarrow.timestamp('ms', tz='UTC'))
+	return(pyarrow.string())
+
+### CLASSES ###########################################
+
+class ParquetFile():
+	'''
+	Columnar, typed and compressed output sink that sits alongside CSVFile
+	Writes a daily partition folder (<log_folder>/<name>/date=YYYY_MM_DD/) with one part file per run
+	Rows are buffered and written out as row groups of row_group_size, close() writes the last group and the footer
+	columns is a list of (header, type) where type is one of COLUMN_TYPES
+	'''
+	def __init__(self, name: str, columns: list, log_folder='./parquet/', row_group_size=50000, compression='zstd', debug=False):
+		self.name = name
+		self.columns = [(str(c[0]), c[1] if c[1] in COLUMN_TYPES else 'string') for c in columns]
+		self.log_folder = log.normalizePathOS(str(log_folder))
+		self.row_group_size = row_group_size
+		self.compression = compression
+		self.debug = debug
+		self.available = isAvailable()
+		self.buffer = []
+		self.writer = None
+		self.rows_written = 0
+		now = datetime.datetime.now()
+		self.partition_folder = os.path.join(self.log_folder, self.name, 'date=' + now.strftime("%Y_%m_%d"))
+		self.log_path = os.path.join(self.partition_folder, 'part-' + now.strftime("%H%M%S") + '-' + str(os.getpid()) + '.parquet')
+		if not self.available:
+			print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + self.name + "): pyarrow is not installed, parquet output is disabled -")
+			return
+		self.schema = pyarrow.schema([(c[0], arrowType(c[1])) for c in self.columns])
+
+	def writeLinesToParquet(self, rows: list):
+		'''
+		Buffers rows (lists in the same order as columns) and writes full row groups as they fill up
+		'''
+		if not self.available:
+			return(False)
+		self.buffer.extend(rows)
+		while len(self.buffer) >= self.row_group_size:
+			self.writeRowGroup(self.buffer[:self.row_group_size])
+			self.buffer = self.buffer[self.row_group_size:]
+		return(True)
+
+	def writeRowGroup(self, rows: list):
+		if not rows:
+			return
+		if self.writer is None:
+			os.makedirs(self.partition_folder, exist_ok=True)
+			self.writer = pyarrow.parquet.ParquetWriter(self.log_path, self.schema, compression=self.compression)
+		arrays = []
+		for i, (column_name, column_type) in enumerate(self.columns):
+			arrays.append(pyarrow.array([convertValue(row[i] if i < len(row) else None, column_type) for row in rows], type=arrowType(column_type)))
+		self.writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.schema))
+		self.rows_written += len(rows)
+		if self.debug:
+			print("- WRLog(" + str(sys._getframe().f_lineno) +") (" + self.name + "): Wrote row group of " + str(len(rows)) + " rows to " + self.log_path + " -")
+
+	def close(self):
+		'''
+		Writes any buffered rows and the file footer, the part file is not readable until this is called
+		'''
+		if not self.available:
+			return
+		try:
+			self.writeRowGroup(self.buffer)
+			self.buffer = []
+		finally:
+			if self.writer is not None:
+				self.writer.close()
+				self.writer = None
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+##############################################################################################################
+# Contact: Will Rivendell
+# 	E1: wrivendell@splunk.com
+# 	E2: contact@willrivendell.com
+##############################################################################################################
+
+### IMPORTS ###########################################
+import math, heapq
+
+### GLOBALS ###########################################
+DEFAULT_METRICS = ('latency_total_ms', 'iops_total', 'throughput_total_mbps', 'space_used_gib')
+DEFAULT_TOP_N = 10
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+### CLASSES ###########################################
+
+class QuantileSketch():
+	'''
+	Mergeable streaming quantile sketch with log spaced buckets (DDSketch style): any quantile it returns is within
+	relative_accuracy of the true value, and it only keeps one counter per occupied bucket - about 1,400 buckets
+	cover 0.001 .. 1,000,000 at 1% - no matter how many values are added
+	Zero values are counted on their own, negatives are ignored (none of the VM metrics can be negative)
+	'''
+	__slots__ = ('relative_accuracy', 'gamma', 'log_gamma', 'buckets', 'zeros', 'count', 'minimum', 'maximum')
+
+	def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+		self.relative_accuracy = relative_accuracy
+		self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+		self.log_gamma = math.log(self.gamma)
+		self.buckets = {} # bucket index -> count
+		self.zeros = 0
+		self.count = 0
+		self.minimum = None
+		self.maximum = None
+
+	def add(self, value:float):
+		if value < 0:
+			return
+		self.count += 1
+		self.minimum = value if self.minimum is None else min(self.minimum, value)
+		self.maximum = value if self.maximum is None else max(self.maximum, value)
+		if value == 0:
+			self.zeros += 1
+			return
+		index = math.ceil(math.log(value) / self.log_gamma)
+		self.buckets[index] = self.buckets.get(index, 0) + 1
+
+	def merge(self, other):
+		for index, count in other.buckets.items():
+			self.buckets[index] = self.buckets.get(index, 0) + count
+		self.zeros += other.zeros
+		self.count += other.count
+		for value in (other.minimum, other.maximum):
+			if value is not None:
+				self.minimum = value if self.minimum is None else min(self.minimum, value)
+				self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+	def quantile(self, q:float):
+		'''
+		Estimated value at quantile q (0 .. 1), None if the sketch is empty
+		'''
+		if not self.count:
+			return(None)
+		rank = q * (self.count - 1)
+		if rank < self.zeros:
+			return(0.0)
+		seen = self.zeros
+		for index in sorted(self.buckets):
+			seen += self.buckets[index]
+			if seen > rank:
+				# bucket midpoint, clamped to what was really seen
+				return(min(max(2 * math.pow(self.gamma, index) / (self.gamma + 1), self.minimum), self.maximum))
+		return(self.maximum)
+
+class TopN():
+	'''
+	The n largest values seen with their labels, a bounded min heap - O(log n) per value and n entries of memory
+	'''
+	__slots__ = ('n', 'heap', 'counter')
+
+	def __init__(self, n=DEFAULT_TOP_N):
+		self.n = max(int(n), 1)
+		self.heap = []
+		self.counter = 0 # tie breaker so labels never get compared
+
+	def add(self, value:float, label):
+		self.counter += 1
+		if len(self.heap) < self.n:
+			heapq.heappush(self.heap, (value, self.counter, label))
+		elif value > self.heap[0][0]:
+			heapq.heapreplace(self.heap, (value, self.counter, label))
+
+	def merge(self, other):
+		for value, _, label in other.heap:
+			self.add(value, label)
+
+	def items(self) -> list:
+		'''
+		(value, label) largest first
+		'''
+		return([(value, label) for value, _, label in sorted(self.heap, reverse=True)])
+
+class VMRollup():
+	'''
+	Per device (or, merged, fleet wide) summary of the per VM metrics: a TopN and a QuantileSketch per metric
+	Memory is bounded by top_n and the sketch buckets, not by the number of VMs folded in
+	'''
+	def __init__(self, metrics=DEFAULT_METRICS, top_n=DEFAULT_TOP_N, quantiles=DEFAULT_QUANTILES):
+		self.metrics = tuple(metrics)
+		self.quantiles = tuple(quantiles)
+		self.top = {metric: TopN(top_n) for metric in self.metrics}
+		self.sketches = {metric: QuantileSketch() for metric in self.metrics}
+		self.vm_count = 0
+
+	def add(self, vm_stats:dict, label=None):
+		'''
+		Folds in one wr_tintri.vmStats() dict, label defaults to the VM's name (uuid if it has none)
+		A (device, vm) tuple as label keeps VMs of the same name on different devices apart in a fleet rollup
+		'''
+		self.vm_count += 1
+		label = label if label is not None else (vm_stats.get('vm_name') or vm_stats.get('vm_uuid', ''))
+		for metric in self.metrics:
+			value = vm_stats.get(metric)
+			if isinstance(value, bool) or not isinstance(value, (int, float)):
+				continue
+			self.top[metric].add(value, label)
+			self.sketches[metric].add(value)
+
+	def merge(self, other):
+		self.vm_count += other.vm_count
+		for metric in self.metrics:
+			self.top[metric].merge(other.top[metric])
+			self.sketches[metric].merge(other.sketches[metric])
+
+	def summary(self) -> dict:
+		'''
+		Flat dict: vm_count, <metric>_p50 / _p95 / _p99 / _max and <metric>_top (list of {[tintri_name,] vm, value}, largest first)
+		'''
+		summary = {'vm_count': self.vm_count}
+		for metric in self.metrics:
+			sketch = self.sketches[metric]
+			if not sketch.count:
+				continue
+			for q in self.quantiles:
+				summary[metric + '_p' + str(round(q * 100))] = round(sketch.quantile(q), 3)
+			summary[metric + '_max'] = sketch.maximum
+			summary[metric + '_top'] = [{'tintri_name': label[0], 'vm': label[1], 'value': value} if isinstance(label, tuple) else {'vm': label, 'value': value} for value, label in self.top[metric].items()]
+		return(summary)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+##############################################################################################################
+# Contact: Will Rivendell
+# 	E1: wrivendell@splunk.com
+# 	E2: contact@willrivendell.com
+##############################################################################################################
+
+### IMPORTS ###########################################
+import sys, time, threading, collections
+
+from lib import wr_tintri as tintri
+
+### GLOBALS ###########################################
+DEFAULT_INTERVAL_SECONDS = 5
+DEFAULT_BUFFER_SIZE = 720 # one hour of samples per device at the default interval
+
+### FUNCTIONS ###########################################
+def realtimeSample(server_name:str, datastore_uuid:str, stats:dict, fallback_time:float) -> dict:
+	'''
+	Flattens the newest entry of one statsRealtime response into a compact sample dict
+	Stamped with the appliance's own sample time when it sends one, the local time otherwise
+	'''
+	sorted_stats = (stats or {}).get('sortedStats') or []
+	latest = sorted_stats[-1] if sorted_stats else (stats or {})
+	sample_time = tintri.parseTintriTime(latest.get('timeEnd') or latest.get('timeStart') or '')
+	sample = {
+		'time': sample_time / 1000 if sample_time else fallback_time,
+		'tintri_name': server_name,
+		'datastore_uuid': datastore_uuid,
+	}
+	for api_field, field in tintri.VM_STAT_FIELDS.items():
+		if latest.get(api_field) is not None:
+			sample[field] = latest[api_field]
+	return(sample)
+
+### CLASSES ###########################################
+
+class RealtimeSampler():
+	'''
+	Polls /datastore/<uuid>/statsRealtime of one device every interval_seconds over one persistent session,
+	in its own thread, into a bounded ring buffer (oldest samples are dropped, and counted, if nobody drains it)
+	The sampler's own cost is tracked alongside: requests, errors, request time, thread CPU per sample and overruns
+	(a round of requests that took longer than the interval) - see cost()
+	'''
+	def __init__(self, server_name:str, session_id:str, datastore_uuids=None, interval_seconds=DEFAULT_INTERVAL_SECONDS, buffer_size=DEFAULT_BUFFER_SIZE, debug=False):
+		self.server_name = server_name
+		self.datastore_uuids = list(datastore_uuids or ['default'])
+		self.interval_seconds = max(float(interval_seconds), 0.1)
+		self.debug = debug
+		self.session = tintri.newSession(session_id, pool_size=1)
+		self.samples = collections.deque(maxlen=max(int(buffer_size), 1))
+		self.lock = threading.Lock()
+		self.stop_event = threading.Event()
+		self.thread = None
+		self.started = None
+		self.stopped = None
+		self.rounds = 0
+		self.sample_count = 0
+		self.dropped = 0
+		self.requests = 0
+		self.errors = 0
+		self.overruns = 0
+		self.request_seconds = 0.0
+		self.cpu_seconds = 0.0
+		self.last_error = ''
+
+	def start(self):
+		self.started = time.time()
+		self.thread = threading.Thread(target=self.run, name="tintri_sampler_" + self.server_name, daemon=True)
+		self.thread.start()
+
+	def run(self):
+		next_round = time.monotonic()
+		while not self.stop_event.is_set():
+			cpu_start = time.thread_time()
+			self.sampleOnce()
+			self.cpu_seconds += time.thread_time() - cpu_start
+			self.rounds += 1
+			next_round += self.interval_seconds
+			wait = next_round - time.monotonic()
+			if wait < 0:
+				# fell behind, skip the missed slots rather than firing a burst of requests at the array
+				self.overruns += 1
+				next_round = time.monotonic()
+				continue
+			self.stop_event.wait(wait)
+
+	def sampleOnce(self):
+		for datastore_uuid in self.datastore_uuids:
+			if self.stop_event.is_set():
+				return
+			request_start = time.monotonic()
+			self.requests += 1
+			try:
+				stats = tintri.getJSON(self.session, self.server_name, '/datastore/' + datastore_uuid + '/statsRealtime', timeout=max(self.interval_seconds * 2, 10))
+			except Exception as ex:
+				self.errors += 1
+				self.last_error = str(ex)
+				if self.debug:
+					print("- WRSampler(" + str(sys._getframe().f_lineno) +") (" + self.server_name + "): statsRealtime failed on " + datastore_uuid + ": " + str(ex) + " -")
+				continue
+			finally:
+				self.request_seconds += time.monotonic() - request_start
+			sample = realtimeSample(self.server_name, datastore_uuid, stats, time.time())
+			with self.lock:
+				if len(self.samples) == self.samples.maxlen:
+					self.dropped += 1
+				self.samples.append(sample)
+				self.sample_count += 1
+
+	def drain(self) -> list:
+		'''
+		Takes every buffered sample out of the ring, oldest first
+		'''
+		with self.lock:
+			samples = list(self.samples)
+			self.samples.clear()
+		return(samples)
+
+	def stop(self):
+		self.stop_event.set()
+		if self.thread is not None:
+			self.thread.join(tintri.REQUEST_TIMEOUT)
+		self.stopped = time.time()
+		self.session.close()
+
+	def cost(self) -> dict:
+		'''
+		What sampling has cost so far, so the load on the array and on the forwarder can be bounded
+		'''
+		elapsed = max((self.stopped or time.time()) - (self.started or time.time()), 0.001)
+		return({
+			'interval_seconds': self.interval_seconds,
+			'datastores': len(self.datastore_uuids),
+			'rounds': self.rounds,
+			'samples': self.sample_count,
+			'samples_dropped': self.dropped,
+			'requests': self.requests,
+			'request_errors': self.errors,
+			'requests_per_second': round(self.requests / elapsed, 3),
+			'avg_request_ms': round(self.request_seconds / self.requests * 1000, 3) if self.requests else 0,
+			'cpu_ms_per_sample': round(self.cpu_seconds / self.sample_count * 1000, 3) if self.sample_count else 0,
+			'overruns': self.overruns,
+			'elapsed_seconds': round(elapsed, 3),
+		})
+
+	def __enter__(self):
+		self.start()
+		return(self)
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.stop()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+##############################################################################################################
+# Contact: Will Rivendell
+# 	E1: wrivendell@splunk.com
+# 	E2: contact@willrivendell.com
+##############################################################################################################
+
+### IMPORTS ###########################################
+import os, sys, time, array, bisect, hashlib, heapq
+
+### FUNCTIONS ###########################################
+def snapshotFields(snapshot:dict) -> tuple:
+	'''
+	(vm_uuid, snapshot_uuid, create_time_ms) out of one /snapshot item, create_time_ms is None if missing
+	'''
+	vm_uuid = (snapshot.get('vmUuid') or {}).get('uuid', '')
+	snapshot_uuid = (snapshot.get('uuid') or {}).get('uuid', '')
+	create_time = snapshot.get('createTime')
+	try:
+		create_time = float(create_time)
+	except (TypeError, ValueError):
+		create_time = None
+	return(vm_uuid, snapshot_uuid, create_time)
+
+def uuidHash(snapshot_uuid:str) -> int:
+	'''
+	64 bit (signed, fits array 'q') hash of a snapshot uuid - 8 bytes per snapshot in memory instead of a string
+	'''
+	return(int.from_bytes(hashlib.blake2b(snapshot_uuid.encode(), digest_size=8).digest(), 'big', signed=True))
+
+def iterUUIDFile(file_path:str):
+	'''
+	Streams the rows of a sorted snapshot uuid file: (hash, snapshot_uuid, vm_uuid, create_time_ms)
+	'''
+	if not os.path.exists(file_path):
+		return
+	with open(file_path, 'r') as uuid_file:
+		for line in uuid_file:
+			parts = line.rstrip('\n').split('\t')
+			if len(parts) < 4:
+				continue
+			yield((int(parts[0]), parts[1], parts[2], float(parts[3]) if parts[3] else None))
+
+### CLASSES ###########################################
+
+class LatestSnapshotIndex():
+	'''
+	Streaming reducer of a device's snapshot list down to one slot per VM: the latest createTime,
+	that snapshot's uuid and how many snapshots the VM has
+	Slots live in flat typed arrays (8 bytes per number) instead of one object per snapshot, so memory
+	scales with the number of VMs and not the number of snapshots
+	'''
+	__slots__ = ('slots', 'vm_uuids', 'latest_uuids', 'latest_times', 'counts', 'total_snapshots')
+
+	def __init__(self):
+		self.slots = {} # vm_uuid -> slot number
+		self.vm_uuids = []
+		self.latest_uuids = []
+		self.latest_times = array.array('d') # epoch ms
+		self.counts = array.array('q')
+		self.total_snapshots = 0
+
+	def add(self, vm_uuid:str, snapshot_uuid:str, create_time_ms:float):
+		self.total_snapshots += 1
+		slot = self.slots.get(vm_uuid)
+		if slot is None:
+			self.slots[vm_uuid] = len(self.vm_uuids)
+			self.vm_uuids.append(vm_uuid)
+			self.latest_uuids.append(snapshot_uuid)
+			self.latest_times.append(create_time_ms if create_time_ms is not None else 0.0)
+			self.counts.append(1)
+			return
+		self.counts[slot] += 1
+		if create_time_ms is not None and create_time_ms > self.latest_times[slot]:
+			self.latest_times[slot] = create_time_ms
+			self.latest_uuids[slot] = snapshot_uuid
+
+	def addSnapshot(self, snapshot:dict):
+		self.add(*snapshotFields(snapshot))
+
+	def __len__(self) -> int:
+		return(len(self.vm_uuids))
+
+	def get(self, vm_uuid:str) -> tuple:
+		'''
+		(latest_snapshot_uuid, latest_create_time_ms, snapshot_count) for a VM or None if it has no snapshots
+		'''
+		slot = self.slots.get(vm_uuid)
+		if slot is None:
+			return(None)
+		return(self.latest_uuids[slot], self.latest_times[slot], self.counts[slot])
+
+	def iterVMStats(self, now=None):
+		'''
+		Yields one compact dict of snapshot metrics per VM
+		'''
+		now_ms = (now if now is not None else time.time()) * 1000
+		for slot, vm_uuid in enumerate(self.vm_uuids):
+			latest = self.latest_times[slot]
+			stats = {
+				'vm_uuid': vm_uuid,
+				'snapshot_count': self.counts[slot],
+				'latest_snapshot_uuid': self.latest_uuids[slot],
+			}
+			if latest:
+				stats['latest_snapshot_time'] = latest / 1000
+				stats['latest_snapshot_age_hours'] = round((now_ms - latest) / 3600000, 3)
+			yield(stats)
+
+	def deviceStats(self, now=None) -> dict:
+		'''
+		Device level rollup of the per VM metrics
+		'''
+		now_ms = (now if now is not None else time.time()) * 1000
+		stats = {
+			'snapshot_count': self.total_snapshots,
+			'vms_with_snapshots': len(self.vm_uuids),
+		}
+		latest_times = [t for t in self.latest_times if t]
+		if latest_times:
+			stats['newest_snapshot_age_hours'] = round((now_ms - max(latest_times)) / 3600000, 3)
+			stats['stalest_vm_snapshot_age_hours'] = round((now_ms - min(latest_times)) / 3600000, 3)
+			stats['max_snapshots_per_vm'] = max(self.counts)
+		return(stats)
+
+class SnapshotChangeTracker():
+	'''
+	Diffs a device's streamed snapshot list against the set seen on the previous run
+	The previous set is kept on disk as a text file of (hash, uuid, vm_uuid, createTime) rows sorted by hash
+	In memory only the 8 byte hashes of the previous and current sets are held, plus the rows created since
+	the last run - so memory and the emitted events scale with churn, not with the snapshot inventory
+	Use: observe() every snapshot as it streams in (returns the row if it is new), then finish() to get the
+	deleted rows and write the new set, or abort() if the stream did not complete
+	The first run for a device only records the baseline (nothing is reported as created)
+	'''
+	def __init__(self, state_path:str, debug=False):
+		self.state_path = state_path
+		self.debug = debug
+		self.baseline = not os.path.exists(state_path)
+		self.previous_hashes = array.array('q', (row[0] for row in iterUUIDFile(state_path)))
+		self.current_hashes = array.array('q')
+		self.created_rows = []
+
+	def isKnown(self, uuid_hash:int) -> bool:
+		i = bisect.bisect_left(self.previous_hashes, uuid_hash)
+		return(i < len(self.previous_hashes) and self.previous_hashes[i] == uuid_hash)
+
+	def observe(self, snapshot:dict) -> bool:
+		'''
+		Records one streamed snapshot, True if it was not in the previous set
+		'''
+		vm_uuid, snapshot_uuid, create_time = snapshotFields(snapshot)
+		uuid_hash = uuidHash(snapshot_uuid)
+		self.current_hashes.append(uuid_hash)
+		if self.isKnown(uuid_hash):
+			return(False)
+		self.created_rows.append((uuid_hash, snapshot_uuid, vm_uuid, create_time))
+		return(True)
+
+	def finish(self) -> tuple:
+		'''
+		Writes the current set to disk (merge of the surviving previous rows and the created rows, still sorted)
+		Returns (created, deleted) lists of (snapshot_uuid, vm_uuid, create_time_ms), both empty on the baseline run
+		Changes are only reported here, once the stream completed, so a failed run never emits half a diff
+		'''
+		current = array.array('q', sorted(self.current_hashes))
+		self.current_hashes = current
+		self.created_rows.sort()
+		# same snapshot listed twice (page shifted during the walk)
+		self.created_rows = [row for i, row in enumerate(self.created_rows) if i == 0 or not row[0] == self.created_rows[i - 1][0]]
+		deleted = []
+		def survivors():
+			for row in iterUUIDFile(self.state_path):
+				i = bisect.bisect_left(current, row[0])
+				if i < len(current) and current[i] == row[0]:
+					yield(row)
+				else:
+					deleted.append((row[1], row[2], row[3]))
+		tmp_path = self.state_path + '.tmp'
+		os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+		with open(tmp_path, 'w') as uuid_file:
+			for row in heapq.merge(survivors(), self.created_rows):
+				uuid_file.write(str(row[0]) + '\t' + row[1] + '\t' + row[2] + '\t' + ('' if row[3] is None else repr(row[3])) + '\n')
+		os.replace(tmp_path, self.state_path)
+		if self.debug:
+			print("- WRSnapshots(" + str(sys._getframe().f_lineno) +") (" + self.state_path + "): " + str(len(current)) + " snapshots, " + str(len(self.created_rows)) + " created, " + str(len(deleted)) + " deleted -")
+		if self.baseline:
+			return([], [])
+		return([(row[1], row[2], row[3]) for row in self.created_rows], deleted)
+
+	def abort(self):
+		'''
+		Stream failed part way - keep the previous set so the next run diffs against it
+		'''
+		self.current_hashes = array.array('q')
+		self.created_rows = []
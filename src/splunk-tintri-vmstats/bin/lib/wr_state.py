@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+##############################################################################################################
+# Contact: Will Rivendell
+# 	E1: wrivendell@splunk.com
+# 	E2: contact@willrivendell.com
+##############################################################################################################
+
+### IMPORTS ###########################################
+import os, json, re, sys
+
+from lib import wr_logging as log
+
+### FUNCTIONS ###########################################
+def safeFileName(name:str) -> str:
+	'''
+	Device names / ips into something that is safe as part of a file name on any OS
+	'''
+	return(re.sub(r'[^A-Za-z0-9._-]', '_', str(name)))
+
+def writeFileAtomic(file_path:str, data, mode='w'):
+	'''
+	Writes to a temp file and renames it over file_path, so a crash mid write never leaves a half written state file
+	'''
+	tmp_path = file_path + '.tmp'
+	with open(tmp_path, mode) as state_file:
+		state_file.write(data)
+	os.replace(tmp_path, file_path)
+
+### CLASSES ###########################################
+
+class JSONStateFile():
+	'''
+	Small JSON document kept between runs (watermarks, checkpoints, streaming model state ...)
+	One file per name in state_folder, loaded on create and written atomically by save()
+	'''
+	def __init__(self, name: str, state_folder='./state/', default=None, debug=False):
+		self.name = name
+		self.state_folder = log.normalizePathOS(str(state_folder))
+		self.state_path = os.path.join(self.state_folder, safeFileName(name) + '.json')
+		self.debug = debug
+		self.data = self.load(default)
+
+	def load(self, default=None):
+		try:
+			with open(self.state_path, 'r') as state_file:
+				return(json.load(state_file))
+		except FileNotFoundError:
+			pass
+		except Exception as ex:
+			print("- WRState(" + str(sys._getframe().f_lineno) +") (" + self.state_path + "): Could not read state, starting fresh: " + str(ex) + " -")
+		return(default if default is not None else {})
+
+	def save(self) -> bool:
+		try:
+			os.makedirs(self.state_folder, exist_ok=True)
+			writeFileAtomic(self.state_path, json.dumps(self.data, separators=(',', ':')))
+			return(True)
+		except Exception as ex:
+			print("- WRState(" + str(sys._getframe().f_lineno) +") (" + self.state_path + "): Could not save state: " + str(ex) + " -")
+			return(False)
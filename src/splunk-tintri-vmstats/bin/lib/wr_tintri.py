@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+##############################################################################################################
+# Contact: Will Rivendell
+# 	E1: wrivendell@splunk.com
+# 	E2: contact@willrivendell.com
+##############################################################################################################
+
+### IMPORTS ###########################################
+import sys, time, datetime, queue, threading, collections, concurrent.futures, requests
+
+### GLOBALS ###########################################
+API_PATH = '/api/v310'
+DEFAULT_PAGE_SIZE = 100
+MIN_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 1000
+REQUEST_TIMEOUT = 120
+CLOSE_WAIT_SECONDS = 1 # how long close() waits for an in flight prefetch before leaving it to finish in the background
+# statsSummary fields that add up across datastores for the device rollup
+DATASTORE_SUM_FIELDS = ('spaceTotalGiB', 'spaceRemainingPhysicalGiB', 'vmsCount', 'spaceUsedSnapshotsHypervisorGiB', 'spaceUsedSnapshotsTintriGiB')
+# VirtualMachineStat fields we keep per VM -> event field name
+VM_STAT_FIELDS = {
+	'operationsTotalIops': 'iops_total',
+	'operationsReadIops': 'iops_read',
+	'operationsWriteIops': 'iops_write',
+	'throughputTotalMBps': 'throughput_total_mbps',
+	'throughputReadMBps': 'throughput_read_mbps',
+	'throughputWriteMBps': 'throughput_write_mbps',
+	'latencyTotalMs': 'latency_total_ms',
+	'latencyHostMs': 'latency_host_ms',
+	'latencyNetworkMs': 'latency_network_ms',
+	'latencyStorageMs': 'latency_storage_ms',
+	'latencyDiskMs': 'latency_disk_ms',
+	'spaceUsedGiB': 'space_used_gib',
+	'spaceProvisionedGiB': 'space_provisioned_gib',
+	'spaceUsedLiveGiB': 'space_used_live_gib',
+	'spaceUsedSnapshotsTintriGiB': 'space_used_snapshots_tintri_gib',
+	'spaceUsedSnapshotsHypervisorGiB': 'space_used_snapshots_hypervisor_gib',
+}
+
+### FUNCTIONS ###########################################
+def newSession(session_id:str, pool_size=10) -> requests.Session:
+	'''
+	One persistent (keep-alive) HTTP session per device, authenticated with the JSESSIONID from login
+	pool_size is how many connections can be kept open to the device at once (parallel page fetches)
+	'''
+	session = requests.Session()
+	session.verify = False
+	adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1))
+	session.mount('https://', adapter)
+	session.headers.update({'content-type': 'application/json', 'cookie': 'JSESSIONID=' + session_id})
+	return(session)
+
+def getJSON(session:requests.Session, server_name:str, path:str, params=None, timeout=REQUEST_TIMEOUT) -> dict:
+	'''
+	GET https://<server_name>/api/v310<path> and return the decoded JSON
+	Raises requests.HTTPError on a non 200 status
+	'''
+	r = session.get('https://' + server_name + API_PATH + path, params=params, timeout=timeout)
+	if not r.status_code == 200:
+		raise requests.HTTPError("HTTP Status code is not 200 on " + path + ": " + str(r.status_code), response=r)
+	return(r.json())
+
+def iterPages(session:requests.Session, server_name:str, path:str, params=None, page_size=DEFAULT_PAGE_SIZE, debug=False):
+	'''
+	Generator over the pages of a paginated list endpoint (/vm, /virtualDisk, /snapshot ...)
+	Walks offset / limit windows until filteredTotal is reached, only one page is held in memory at a time
+	'''
+	offset = 0
+	while True:
+		page_params = dict(params or {})
+		page_params.update({'offset': offset, 'limit': page_size})
+		page = getJSON(session, server_name, path, page_params)
+		items = page.get('items') or []
+		if debug:
+			print("- WRTintri(" + str(sys._getframe().f_lineno) +") (" + server_name + "): " + path + " offset " + str(offset) + " returned " + str(len(items)) + " of " + str(page.get('filteredTotal')) + " -")
+		yield(page)
+		offset += len(items)
+		if not items or offset >= int(page.get('filteredTotal', 0)):
+			return
+
+def iterItems(session:requests.Session, server_name:str, path:str, params=None, page_size=DEFAULT_PAGE_SIZE, debug=False):
+	'''
+	Same as iterPages() but yields the items one at a time
+	'''
+	for page in iterPages(session, server_name, path, params, page_size, debug):
+		yield from page.get('items') or []
+
+def tunePageSize(page_size:int, elapsed_seconds:float, target_seconds:float, min_size=MIN_PAGE_SIZE, max_size=MAX_PAGE_SIZE) -> int:
+	'''
+	Scales the page size so a page takes about target_seconds to come back, based on how long the last one took
+	'''
+	if elapsed_seconds <= 0:
+		return(min(max(page_size, min_size), max_size))
+	return(int(min(max(page_size * target_seconds / elapsed_seconds, min_size), max_size)))
+
+def iterPagesParallel(session:requests.Session, server_name:str, path:str, params=None, page_size=DEFAULT_PAGE_SIZE, max_in_flight=4, ordered=True, target_seconds=0, debug=False):
+	'''
+	Generator over the pages of a paginated list endpoint, fetched concurrently
+	The first page is fetched on its own to learn filteredTotal, the remaining offset windows are then
+	requested by a thread pool with at most max_in_flight requests outstanding against the device
+	ordered=True yields pages in offset order, False yields them as they arrive
+	target_seconds > 0 re-sizes the remaining pages from how long the first one took (see tunePageSize)
+	At most max_in_flight pages are held in memory at once
+	'''
+	def fetch(offset, limit):
+		# a device may cap limit below what was asked for, keep reading until the window is full
+		items = []
+		while True:
+			page_params = dict(params or {})
+			page_params.update({'offset': offset + len(items), 'limit': limit - len(items)})
+			page = getJSON(session, server_name, path, page_params)
+			received = page.get('items') or []
+			items.extend(received)
+			if not received or len(items) >= limit or offset + len(items) >= int(page.get('filteredTotal', 0)):
+				page['items'] = items
+				return(page)
+
+	max_in_flight = max(max_in_flight, 1)
+	start = time.monotonic()
+	first = fetch(0, page_size)
+	elapsed = time.monotonic() - start
+	yield(first)
+	total = int(first.get('filteredTotal', 0))
+	offset = len(first.get('items') or [])
+	if not offset or offset >= total:
+		return
+	if target_seconds > 0:
+		page_size = tunePageSize(page_size, elapsed, target_seconds)
+	windows = collections.deque((o, page_size) for o in range(offset, total, page_size))
+	if debug:
+		print("- WRTintri(" + str(sys._getframe().f_lineno) +") (" + server_name + "): " + path + " first page took " + str(round(elapsed, 3)) + "s, fetching " + str(len(windows)) + " more pages of " + str(page_size) + " with " + str(max_in_flight) + " in flight -")
+
+	with concurrent.futures.ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="tintri_pages") as pool:
+		in_flight = collections.deque()
+		try:
+			while windows or in_flight:
+				while windows and len(in_flight) < max_in_flight:
+					in_flight.append(pool.submit(fetch, *windows.popleft()))
+				if ordered:
+					yield(in_flight.popleft().result())
+				else:
+					done, pending = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+					for future in done:
+						in_flight.remove(future)
+					for future in done:
+						yield(future.result())
+		finally:
+			# caller stopped early or a page failed - don't start anything that is still queued
+			for future in in_flight:
+				future.cancel()
+
+def iterItemsParallel(session:requests.Session, server_name:str, path:str, params=None, page_size=DEFAULT_PAGE_SIZE, max_in_flight=4, ordered=True, target_seconds=0, debug=False):
+	'''
+	Same as iterPagesParallel() but yields the items one at a time
+	'''
+	for page in iterPagesParallel(session, server_name, path, params, page_size, max_in_flight, ordered, target_seconds, debug):
+		yield from page.get('items') or []
+
+def iterItemsPrefetch(session:requests.Session, server_name:str, path:str, params=None, page_size=DEFAULT_PAGE_SIZE, lookahead=1, debug=False):
+	'''
+	Yields the items of a 'next'-linked list, with the following pages prefetched in the background
+	'''
+	with PagePrefetcher(session, server_name, path, params, page_size, lookahead, debug) as pages:
+		for page in pages:
+			yield from page.get('items') or []
+
+def iterListItems(session:requests.Session, server_name:str, path:str, params=None, page_size=DEFAULT_PAGE_SIZE, pages_in_flight=4, pagination='offset', target_seconds=0, debug=False):
+	'''
+	Items of a paginated list endpoint using the chosen strategy
+	offset - concurrent offset windows (iterItemsParallel), items arrive in page completion order
+	         one page in flight without page re-sizing just walks the pages in order (iterItems), no thread pool
+	cursor - follows the 'next' cursor with pages_in_flight pages prefetched (iterItemsPrefetch), items in order
+	'''
+	if pagination == 'cursor':
+		return(iterItemsPrefetch(session, server_name, path, params, page_size, pages_in_flight, debug))
+	if pages_in_flight <= 1 and not target_seconds > 0:
+		return(iterItems(session, server_name, path, params, page_size, debug))
+	return(iterItemsParallel(session, server_name, path, params, page_size, pages_in_flight, False, target_seconds, debug))
+
+def parseTintriTime(value) -> float:
+	'''
+	Tintri times come back as epoch milliseconds or as ISO 8601 strings depending on the field / version
+	Returns epoch milliseconds as a float, or None if the value can't be read
+	'''
+	if isinstance(value, (int, float)):
+		return(float(value))
+	if not value:
+		return(None)
+	try:
+		return(float(value))
+	except (TypeError, ValueError):
+		pass
+	try:
+		return(datetime.datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp() * 1000)
+	except ValueError:
+		return(None)
+
+def vmStats(vm:dict) -> dict:
+	'''
+	Flattens one /vm item into the compact set of fields the TA emits per VM
+	Stats that the appliance did not return are left out rather than sent as empty
+	'''
+	vmware = vm.get('vmware') or {}
+	stats = {
+		'vm_uuid': (vm.get('uuid') or {}).get('uuid', ''),
+		'vm_name': vmware.get('name', ''),
+		'hypervisor_type': vmware.get('hypervisorType', ''),
+		'last_updated_time': vm.get('lastUpdatedTime', ''),
+	}
+	sorted_stats = (vm.get('stat') or {}).get('sortedStats') or []
+	if sorted_stats:
+		latest = sorted_stats[-1]
+		for api_field, field in VM_STAT_FIELDS.items():
+			if latest.get(api_field) is not None:
+				stats[field] = latest[api_field]
+	return(stats)
+
+def listDatastores(session:requests.Session, server_name:str) -> list:
+	'''
+	uuids of every datastore on the device, the appliance answers /datastore with either a plain list or a page
+	'''
+	datastores = getJSON(session, server_name, '/datastore')
+	if isinstance(datastores, dict):
+		datastores = datastores.get('items') or []
+	return([(d.get('uuid') or {}).get('uuid', '') for d in datastores if (d.get('uuid') or {}).get('uuid')])
+
+def getDatastoreSummaries(session:requests.Session, server_name:str, datastore_uuids:list, max_in_flight=4, debug=False) -> dict:
+	'''
+	statsSummary of each datastore, max_in_flight requests at once over the one session
+	Returns {datastore_uuid: summary} in the order of datastore_uuids, the first failed request is raised
+	'''
+	if debug:
+		print("- WRTintri(" + str(sys._getframe().f_lineno) +") (" + server_name + "): fetching statsSummary of " + str(len(datastore_uuids)) + " datastore(s) -")
+	if len(datastore_uuids) == 1:
+		return({datastore_uuids[0]: getJSON(session, server_name, '/datastore/' + datastore_uuids[0] + '/statsSummary')})
+	with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(max_in_flight, len(datastore_uuids)))) as executor:
+		futures = [executor.submit(getJSON, session, server_name, '/datastore/' + uuid + '/statsSummary') for uuid in datastore_uuids]
+		return({uuid: future.result() for uuid, future in zip(datastore_uuids, futures)})
+
+def rollupDatastores(summaries:list) -> dict:
+	'''
+	Device level statsSummary out of the per datastore ones, in the same shape so parse_vmstats() reads it unchanged
+	Space and counts are summed, the savings factor is weighted by each datastore's used physical space
+	'''
+	rollup = {field: sum(summary.get(field) or 0 for summary in summaries) for field in DATASTORE_SUM_FIELDS}
+	used = [(summary.get('spaceTotalGiB') or 0) - (summary.get('spaceRemainingPhysicalGiB') or 0) for summary in summaries]
+	weights = used if sum(used) > 0 else [summary.get('spaceTotalGiB') or 0 for summary in summaries]
+	if sum(weights) > 0:
+		rollup['spaceSavingsFactor'] = sum(w * (summary.get('spaceSavingsFactor') or 1) for w, summary in zip(weights, summaries)) / sum(weights)
+	else:
+		rollup['spaceSavingsFactor'] = 1
+	rollup['datastoreCount'] = len(summaries)
+	return(rollup)
+
+def datastoreFields(summary:dict) -> dict:
+	'''
+	The capacity fields the TA sends per device (same names, as numbers) computed for one datastore's statsSummary
+	'''
+	total = summary.get('spaceTotalGiB') or 0
+	free = summary.get('spaceRemainingPhysicalGiB') or 0
+	factor = summary.get('spaceSavingsFactor') or 1
+	fields = {
+		'physical_space_gib': total,
+		'physical_free_gib': free,
+		'physical_used_gib': total - free,
+		'logical_space_gib': total * factor,
+		'logical_free_gib': free * factor,
+		'logical_used_gib': (total - free) * factor,
+		'saving_factor': factor,
+		'number_of_vms': summary.get('vmsCount', 0),
+		'snapshots_on_hypervisor_gib': summary.get('spaceUsedSnapshotsHypervisorGiB', 0),
+		'snapshots_on_tintri_gib': summary.get('spaceUsedSnapshotsTintriGiB', 0),
+	}
+	if total:
+		fields['percent_used'] = 100 - (free / total * 100)
+	return(fields)
+
+### CLASSES ###########################################
+
+class PagePrefetcher():
+	'''
+	Iterator over 'next'-linked pages (the cursor the appliance returns in each page) that fetches
+	page N+1 .. N+lookahead in a background thread while the caller is still working on page N
+	A page is only requested once a lookahead slot is free, so at most lookahead pages are fetched (or in flight)
+	ahead of the one the caller is working on
+	Use it as a context manager, or call close(), to stop the background fetches if you stop iterating early
+	A failed request is raised from the iterator at the point that page would have been returned
+	'''
+	def __init__(self, session:requests.Session, server_name:str, path:str, params=None, page_size=DEFAULT_PAGE_SIZE, lookahead=1, debug=False):
+		self.session = session
+		self.server_name = server_name
+		self.path = path
+		self.params = dict(params or {})
+		self.params.update({'offset': 0, 'limit': page_size})
+		self.debug = debug
+		self.slots = threading.Semaphore(max(lookahead, 1)) # taken before a fetch, given back when the page is handed out
+		self.pages = queue.Queue()
+		self.stop_event = threading.Event()
+		self.done = False
+		self.thread = threading.Thread(target=self.fetchPages, name="tintri_prefetch_" + server_name, daemon=True)
+		self.thread.start()
+
+	def acquireSlot(self) -> bool:
+		# blocks while the lookahead is full, gives up if closed
+		while not self.stop_event.is_set():
+			if self.slots.acquire(timeout=0.2):
+				return(True)
+		return(False)
+
+	def fetchPages(self):
+		path = self.path
+		params = self.params
+		try:
+			while self.acquireSlot():
+				page = getJSON(self.session, self.server_name, path, params)
+				if self.debug:
+					print("- WRTintri(" + str(sys._getframe().f_lineno) +") (" + self.server_name + "): prefetched " + path + " (" + str(len(page.get('items') or [])) + " items) -")
+				if self.stop_event.is_set():
+					return
+				self.pages.put(page)
+				if not page.get('next') or not page.get('items'):
+					break
+				path = self.path + '?' + page['next'] # the cursor is a ready made query string
+				params = None
+		except Exception as ex:
+			self.pages.put(ex)
+			return
+		self.pages.put(StopIteration())
+
+	def __iter__(self):
+		return(self)
+
+	def __next__(self) -> dict:
+		if self.done:
+			raise StopIteration
+		item = self.pages.get()
+		if isinstance(item, BaseException):
+			self.done = True
+			self.close()
+			if isinstance(item, StopIteration):
+				raise StopIteration
+			raise item
+		self.slots.release()
+		return(item)
+
+	def close(self):
+		'''
+		Stops the background fetches, an in progress request is allowed to finish in the background (the thread
+		is a daemon) but its page is dropped - close() only waits CLOSE_WAIT_SECONDS for it
+		'''
+		self.done = True
+		self.stop_event.set()
+		while True:
+			try:
+				self.pages.get_nowait()
+			except queue.Empty:
+				break
+		if not self.thread is threading.current_thread():
+			self.thread.join(CLOSE_WAIT_SECONDS)
+
+	def __enter__(self):
+		return(self)
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
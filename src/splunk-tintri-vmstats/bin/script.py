@@ -5,10 +5,21 @@
 ##############################################################################################################
 
 ### Imports ###########################################
-import datetime, time, sys, requests, json, urllib3
+import datetime, time, os, sys, threading, concurrent.futures, requests, json, urllib3
 
 from lib import wr_logging as log
 from lib import wr_arguments as arguments
+from lib import wr_tintri as tintri
+from lib import wr_state as state
+from lib import wr_snapshots as snapshots
+from lib import wr_inventory as inventory
+from lib import wr_sampler as sampler
+from lib import wr_aggregate as aggregate
+from lib import wr_backfill as backfill
+from lib import wr_history as history
+from lib import wr_forecast as forecast
+from lib import wr_anomaly as anomaly
+from lib import wr_rollup as rollup
 
 ### Globals ###########################################
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning) # disables the nagging insecure warning, we know we're hitting our own splunk servers so we dont care
@@ -16,8 +27,41 @@ log_file = log.LogFile('splunk_tintri_ta', log_folder=arguments.args.log_locatio
 if arguments.args.debug:
 	print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Log file created in ./logs/\n\n")
 tintri_session_id = ''
+run_time = time.time() # one timestamp for the run wide (fleet) events
 vmstats_raw_json = []
+device_snapshot_counts = {} # device -> snapshots counted this run, by the snapshot or inventory collector
+realtime_devices = [] # (device, session_id) pairs for the realtime sampler
+backfill_devices = [] # (device, session_id) pairs for the historic stats backfill
+backfill_lock = threading.Lock() # backfill workers send to HEC one at a time
+hec_timeout = 60 # seconds before a HEC send counts as failed
+forecast_states = {} # device -> JSONStateFile of its capacity forecasters, loaded once per run
+fleet_vm_rollup = None # per VM metric rollups of all devices merged, see emit_vm_rollup
 splunk_events_list = []
+vmstats_csv_rows = [] # csv rows from every device, written in one append per run
+vmstats_csv_header = [
+	"tintri_name",
+	"current_capacity_gib",
+	"filesystem_id",
+	"model_name",
+	"os_version",
+	"product_id",
+	"serial_number",
+	"physical_space_gib",
+	"physical_free_gib",
+	"physical_used_gib",
+	"logical_space_gib",
+	"logical_free_gib",
+	"logical_used_gib",
+	"percent_used",
+	"saving_factor",
+	"number_of_vms",
+	"snapshots_on_hypervisor_gib",
+	"snapshots_on_tintri_gib",
+	"total_snapshots"
+	]
+run_summary = {"devices": len(arguments.args.server_names), "datastores": 0, "vm_events": 0, "vms_skipped_unchanged": 0, "vms_deleted": 0, "snapshots_seen": 0, "snapshots_created": 0, "snapshots_deleted": 0, "inventory_vms": 0, "realtime_samples": 0, "realtime_windows": 0, "realtime_samples_sent": 0, "realtime_anomalies": 0, "realtime_volume_saved_pct": 0, "backfill_samples": 0} # printed at the end of the run
+vmstats_parquet_rows = [] # typed rows for the optional parquet sink
+vmstats_parquet_columns = [("time", "timestamp")] + [(h, "string") if h in ("tintri_name", "filesystem_id", "model_name", "os_version", "product_id", "serial_number") else (h, "int64") if h == "number_of_vms" else (h, "float64") for h in vmstats_csv_header]
 
 ### Functions ###########################################
 # generate a time stamp that Splunk likes based on system time (not used, used epoch instead)
@@ -136,6 +180,59 @@ def get_device_info(session_id:str, server_name:str):
 
 	return(r.text, True)
 
+# get the statsSummary of every datastore on the device plus a device rollup
+def get_datastore_stats(session_id:str, server_name:str) -> tuple:
+	'''
+	The datastore list is read once and cached per device in state_location (refreshed every datastore_list_hours,
+	or straight away if a cached datastore is gone), then all statsSummary calls run in parallel over one session
+	One datastore_stats event is queued per datastore, the rollup is returned in the statsSummary shape
+	If any datastore's statsSummary fails (after one re-list on a 404) only datastore/default is collected this run
+	Returns (rollup dict, True) or ('', False)
+	'''
+	cache = state.JSONStateFile(server_name + "_datastores", state_folder=arguments.args.state_location, default={"listed": 0, "uuids": []}, debug=arguments.args.debug_modules)
+	session = tintri.newSession(session_id, pool_size=arguments.args.api_pages_in_flight)
+	try:
+		for attempt in range(2):
+			if attempt or not cache.data.get("uuids") or time.time() - cache.data.get("listed", 0) >= arguments.args.datastore_list_hours * 3600:
+				try:
+					cache.data = {"listed": time.time(), "uuids": tintri.listDatastores(session, server_name) or ["default"]}
+				except requests.HTTPError as ex:
+					# older appliances / restricted roles - fall back to the one datastore every VMstore has
+					log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Could not list datastores on " + server_name + ", using datastore/default only: " + str(ex)])
+					cache.data = {"listed": time.time(), "uuids": ["default"]}
+				cache.save()
+			try:
+				summaries = tintri.getDatastoreSummaries(session, server_name, cache.data["uuids"], max_in_flight=arguments.args.api_pages_in_flight, debug=arguments.args.debug_modules)
+				break
+			except Exception as ex:
+				if not attempt and isinstance(ex, requests.HTTPError) and ex.response is not None and ex.response.status_code == 404:
+					continue # a cached datastore has gone away, list again and retry once
+				if cache.data["uuids"] == ["default"]:
+					raise
+				# one datastore failing shouldn't cost the whole device - fall back to the one every VMstore has
+				log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Datastore statsSummary failed on " + server_name + ", using datastore/default only: " + str(ex)])
+				summaries = tintri.getDatastoreSummaries(session, server_name, ["default"], debug=arguments.args.debug_modules)
+				break
+	except Exception as ex:
+		log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Tintri get_datastore_stats ERROR on " + server_name + ": " + str(ex)])
+		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Tintri get_datastore_stats ERROR on " + server_name + ": " + str(ex))
+		return('', False)
+	finally:
+		session.close()
+
+	now = time.time()
+	for datastore_uuid, summary in summaries.items():
+		datastore_fields = {"datastore_uuid": datastore_uuid}
+		datastore_fields.update(tintri.datastoreFields(summary))
+		if arguments.args.forecast:
+			datastore_fields.update(forecast_capacity(server_name, "datastore:" + datastore_uuid, datastore_fields["physical_used_gib"], datastore_fields["physical_free_gib"], now))
+		queue_splunk_event(format_splunk_event(server_name, datastore_fields, event_type="datastore_stats", event_time=now))
+	run_summary["datastores"] += len(summaries)
+	if arguments.args.debug:
+		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Collected statsSummary of " + str(len(summaries)) + " datastore(s) on: " + server_name)
+	log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Collected statsSummary of " + str(len(summaries)) + " datastore(s) on: " + server_name])
+	return(tintri.rollupDatastores(list(summaries.values())), True)
+
 # get the Tintri VMStats from vmstats api
 def get_vmstats(session_id:str, server_name:str):
 	'''
@@ -150,48 +247,125 @@ def get_vmstats(session_id:str, server_name:str):
 	else:
 		return('', False)
 
-	# Header and URL for vmstats call
-	headers = {'content-type': 'application/json','cookie': 'JSESSIONID=' + session_id}
-	url = 'https://' + server_name + '/api/v310/datastore/default/statsSummary'
+	if arguments.args.all_datastores:
+		# every datastore, the rollup takes the place of datastore/default's statsSummary
+		datastore_stats = get_datastore_stats(session_id, server_name)
+		if not datastore_stats[1]:
+			return('', False)
+		vmstats_info = datastore_stats[0]
+	else:
+		# Header and URL for vmstats call
+		headers = {'content-type': 'application/json','cookie': 'JSESSIONID=' + session_id}
+		url = 'https://' + server_name + '/api/v310/datastore/default/statsSummary'
 
-	if arguments.args.debug:
-		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Attempting login to get vmstats for: " + server_name)
-		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Using URL: " + url)
-		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Using Username: " + arguments.args.user_name)
+		if arguments.args.debug:
+			print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Attempting login to get vmstats for: " + server_name)
+			print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Using URL: " + url)
+			print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Using Username: " + arguments.args.user_name)
 
-	log_file.writeLinesToFile([
-		"TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Attempting login to get vmstats for: " + server_name,
-		"TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Using URL: " + url,
-		"TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Using Username: " + arguments.args.user_name,
-		])
+		log_file.writeLinesToFile([
+			"TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Attempting login to get vmstats for: " + server_name,
+			"TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Using URL: " + url,
+			"TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Using Username: " + arguments.args.user_name,
+			])
 	
-	# Attempt pull of VMStats data summary -> check for non 200 status
-	try:
-		r = requests.get( url, headers=headers, verify=False )
+		# Attempt pull of VMStats data summary -> check for non 200 status
+		try:
+			r = requests.get( url, headers=headers, verify=False )
 
-		# if http Response is not 200 then raise an exception and exit
-		if not r.status_code == 200:
-			log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Tintri get_vmstats ERROR: HTTP Status code is not 200 on VMStats Summary API, exiting on: " + str(r.status_code)])
-			print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"):  Tintri get_vmstats ERROR: HTTP Status code is not 200 on VMStats Summary API, exiting on: " + str(r.status_code))
+			# if http Response is not 200 then raise an exception and exit
+			if not r.status_code == 200:
+				log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Tintri get_vmstats ERROR: HTTP Status code is not 200 on VMStats Summary API, exiting on: " + str(r.status_code)])
+				print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"):  Tintri get_vmstats ERROR: HTTP Status code is not 200 on VMStats Summary API, exiting on: " + str(r.status_code))
+				return('', False)
+		except Exception:
+			log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"):  Tintri get_vmstats ERROR: An unexpected error occurred trying to get VMStats Summary from API, exiting."])
+			print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"):  Tintri get_vmstats ERROR: An unexpected error occurred trying to get VMStats Summary from API, exiting.")
 			return('', False)
-	except Exception:
-		log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"):  Tintri get_vmstats ERROR: An unexpected error occurred trying to get VMStats Summary from API, exiting."])
-		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"):  Tintri get_vmstats ERROR: An unexpected error occurred trying to get VMStats Summary from API, exiting.")
-		return('', False)
 
-	# success
-	if arguments.args.debug:
-		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): The HTTP Status code is: " + str(r.status_code))
-		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): The Json response of login call to the server: " + server_name + " is: \n" + r.text + "\n\n")
-	log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): The HTTP Status code is: " + str(r.status_code)])
+		# success
+		if arguments.args.debug:
+			print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): The HTTP Status code is: " + str(r.status_code))
+			print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): The Json response of login call to the server: " + server_name + " is: \n" + r.text + "\n\n")
+		log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): The HTTP Status code is: " + str(r.status_code)])
+		vmstats_info = json.loads(r.text) # store vmstats info in dict
 
 	tmp_dict = {}
-	vmstats_info = {}
-	vmstats_info = json.loads(r.text) # store vmstats info in dict
 	vmstats_info.update(device_details) # add device info to vmstats info dict
 	tmp_dict[server_name]=vmstats_info # add the server name identifier to make a 1 kv pair dict for return
 	return(tmp_dict, True)
 
+# fold one capacity sample into the device's (or one of its datastores') forecast and return the forecast fields
+def forecast_capacity(server_name:str, scope:str, used_gib:float, free_gib:float, sample_time:float, history_samples=None) -> dict:
+	'''
+	One CapacityForecaster per device and per datastore (scope), their state lives in <device>_forecast in state_location
+	O(1) per sample, the regression sums are carried from run to run
+	A scope without forecast state yet is first seeded from history_samples (if given, a callable returning
+	(time, used, free) tuples) so a device with local history has its trend from the first forecast run on
+	'''
+	forecast_state = forecast_states.get(server_name)
+	if forecast_state is None:
+		forecast_state = forecast_states[server_name] = state.JSONStateFile(server_name + "_forecast", state_folder=arguments.args.state_location, debug=arguments.args.debug_modules)
+	forecaster = forecast.CapacityForecaster(forecast_state.data.get(scope), half_life_days=arguments.args.forecast_half_life_days)
+	if not forecast_state.data.get(scope) and history_samples is not None:
+		for history_time, history_used, history_free in history_samples():
+			forecaster.update(history_time, history_used, history_free)
+	forecast_fields = forecaster.update(sample_time, used_gib, free_gib)
+	forecast_state.data[scope] = forecaster.state
+	forecast_state.save()
+	return(forecast_fields)
+
+# the device's local capacity time series
+def open_device_history(server_name:str):
+	return(history.DeviceHistory(server_name, history_folder=os.path.join(log.normalizePathOS(str(arguments.args.state_location)), "history"), debug=arguments.args.debug_modules))
+
+# add this run's capacity figures to the device's local time series and read the trends back off it
+def record_device_history(server_name:str, vmstats_data:dict, sample_time:float) -> dict:
+	'''
+	Physical / logical space, used, free and snapshot space go into the device's DeviceHistory (SQLite, time indexed)
+	Samples older than history_days are pruned as we go
+	Returns the change in physical / logical used space over the last 1, 7 and 30 days (DeviceHistory.trends),
+	as far as the history reaches back
+	'''
+	total = vmstats_data['spaceTotalGiB']
+	free = vmstats_data['spaceRemainingPhysicalGiB']
+	factor = vmstats_data['spaceSavingsFactor']
+	device_history = None
+	trend_fields = {}
+	try:
+		device_history = open_device_history(server_name)
+		device_history.record(sample_time, {
+			"physical_space_gib": total,
+			"physical_used_gib": total - free,
+			"physical_free_gib": free,
+			"logical_space_gib": total * factor,
+			"logical_used_gib": (total - free) * factor,
+			"logical_free_gib": free * factor,
+			"snapshot_space_gib": vmstats_data['spaceUsedSnapshotsHypervisorGiB'] + vmstats_data['spaceUsedSnapshotsTintriGiB'],
+		})
+		device_history.prune(arguments.args.history_days)
+		trend_fields = device_history.trends(sample_time, fields=("physical_used_gib", "logical_used_gib"))
+	except Exception as ex:
+		log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Could not record capacity history for " + server_name + ": " + str(ex)])
+		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Could not record capacity history for " + server_name + ": " + str(ex))
+	finally:
+		if device_history is not None:
+			device_history.close()
+	return(trend_fields)
+
+# (time, physical used, physical free) of every stored sample before a time, oldest first - seeds a new forecast
+def device_history_samples(server_name:str, before:float) -> list:
+	device_history = None
+	try:
+		device_history = open_device_history(server_name)
+		return([(row["time"], row["physical_used_gib"], row["physical_free_gib"]) for row in device_history.iterRange(0, before) if row["physical_used_gib"] is not None and row["physical_free_gib"] is not None])
+	except Exception as ex:
+		log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Could not read capacity history for " + server_name + ": " + str(ex)])
+		return([])
+	finally:
+		if device_history is not None:
+			device_history.close()
+
 # parse the vmstats data for input to Splunk and optional CSV output
 def parse_vmstats(vmstats:dict) -> dict:
 	'''
@@ -227,13 +401,24 @@ def parse_vmstats(vmstats:dict) -> dict:
 	snapshots_on_hypervisor_gb = str(vmstats_data['spaceUsedSnapshotsHypervisorGiB'])
 	snapshots_on_tintri_gb = str(vmstats_data['spaceUsedSnapshotsTintriGiB'])
 	total_snapshots = str(vmstats_data['spaceUsedSnapshotsHypervisorGiB'] + vmstats_data['spaceUsedSnapshotsTintriGiB'])
+	sample_time = time.time()
+
+	# local capacity history, the used space trends are read straight back off it
+	capacity_fields = {}
+	if arguments.args.history:
+		capacity_fields.update(record_device_history(server_name, vmstats_data, sample_time))
+
+	# growth trend / days until full from the persisted forecast state, seeded from the local history if there is one
+	if arguments.args.forecast:
+		history_samples = (lambda: device_history_samples(server_name, sample_time)) if arguments.args.history else None
+		capacity_fields.update(forecast_capacity(server_name, "device", vmstats_data['spaceTotalGiB'] - vmstats_data['spaceRemainingPhysicalGiB'], vmstats_data['spaceRemainingPhysicalGiB'], sample_time, history_samples=history_samples))
 
 	# check if we're doing UPLOAD to Splunk or just CSV write out
 	if not arguments.args.csv_only:
 		if arguments.args.metrics:
 			# METRICS - we want to send this as metrics to Splunk rather than events
 			event_payload =	{
-				"time": time.time(),
+				"time": sample_time,
 				"event": "metric",
 				"host": server_name,
 				"source": arguments.args.event_source,
@@ -263,7 +448,7 @@ def parse_vmstats(vmstats:dict) -> dict:
 		else:
 			# EVENTS - we want to send this as events to Splunk rather than metrics
 			event_payload =	{
-				"time": time.time(),
+				"time": sample_time,
 				"host": server_name,
 				"source": arguments.args.event_source,
 				"sourcetype": arguments.args.event_sourcetype,
@@ -289,6 +474,8 @@ def parse_vmstats(vmstats:dict) -> dict:
 					"total_snapshots": total_snapshots
 				}
 			}
+		if capacity_fields:
+			event_payload["fields" if arguments.args.metrics else "event"].update(capacity_fields)
 
 		if arguments.args.debug:
 			print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): " + str(server_name) + " event formatted for Splunk: \n\n" + str(event_payload) + "\n\n")
@@ -296,14 +483,11 @@ def parse_vmstats(vmstats:dict) -> dict:
 
 	if arguments.args.csv_output or arguments.args.csv_only:
 		if arguments.args.debug:
-			print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Writing CSV Output as requested.")
-		log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Writing CSV Output as requested."])
-
-		# create a wr_logging class for the CSV file
-		event_csv = log.CSVFile("vmstats.csv", log_folder=arguments.args.csv_location, remove_old_logs=True, log_retention_days=arguments.args.retain_csv, prefix_date=True, debug=False)
+			print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Buffering CSV Output as requested.")
+		log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Buffering CSV Output as requested."])
 
-		# create the row of values to write and the header row
-		event_csv.writeLinesToCSV([[
+		# buffer the row of values, the shared CSV sink writes all devices in one append at the end of the run
+		vmstats_csv_rows.append([
 				server_name,
 				current_capacity,
 				filesystem_id,
@@ -323,32 +507,36 @@ def parse_vmstats(vmstats:dict) -> dict:
 				snapshots_on_hypervisor_gb,
 				snapshots_on_tintri_gb,
 				total_snapshots
-			]],
-			header_row=[
-				"tintri_name",
-				"current_capacity_gib",
-				"filesystem_id",
-				"model_name",
-				"os_version",
-				"product_id",
-				"serial_number",
-				"physical_space_gib",
-				"physical_free_gib",
-				"physical_used_gib",
-				"logical_space_gib",
-				"logical_free_gib",
-				"logical_used_gib",
-				"percent_used",
-				"saving_factor",
-				"number_of_vms",
-				"snapshots_on_hypervisor_gib",
-				"snapshots_on_tintri_gib",
-				"total_snapshots"
 			])
 
 		if arguments.args.debug:
-			print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Writing CSV: Complete")
-		log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Writing CSV: Complete"])
+			print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Buffering CSV: Complete")
+		log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Buffering CSV: Complete"])
+
+	if arguments.args.parquet_output:
+		# same columns as the csv, plus the collection time - written typed and compressed at the end of the run
+		vmstats_parquet_rows.append([
+				sample_time,
+				server_name,
+				current_capacity,
+				filesystem_id,
+				model_name,
+				os_version,
+				product_id,
+				serial_number,
+				physical_space,
+				physical_free,
+				physical_used,
+				logical_space,
+				logical_free,
+				logical_used,
+				percent_used,
+				saving_factor,
+				number_of_vms,
+				snapshots_on_hypervisor_gb,
+				snapshots_on_tintri_gb,
+				total_snapshots
+			])
 	
 	# return the Splunk formatted events/metrics for upload or simply return nothing if CSV only
 	if not arguments.args.csv_only:
@@ -356,11 +544,477 @@ def parse_vmstats(vmstats:dict) -> dict:
 	else:
 		return('')
 
+# one fleet wide summary of all devices collected this run
+def build_fleet_summary(vmstats_list:list) -> dict:
+	'''
+	Sums the statsSummary of every collected device in memory - capacity, VMs, snapshot space, the fullest
+	device and how many of the configured devices made it in - so the fleet totals don't have to be stitched
+	together in Splunk from device events with slightly different timestamps
+	'''
+	fleet = {
+		"devices_configured": len(arguments.args.server_names),
+		"devices_collected": 0,
+		"physical_space_gib": 0.0,
+		"physical_used_gib": 0.0,
+		"physical_free_gib": 0.0,
+		"logical_space_gib": 0.0,
+		"logical_used_gib": 0.0,
+		"logical_free_gib": 0.0,
+		"snapshot_space_gib": 0.0,
+		"number_of_vms": 0,
+	}
+	collected = set()
+	worst = None
+	for vmstats in vmstats_list:
+		server_name = list(vmstats.keys())[0]
+		data = vmstats[server_name]
+		total = data['spaceTotalGiB']
+		free = data['spaceRemainingPhysicalGiB']
+		factor = data['spaceSavingsFactor']
+		collected.add(server_name)
+		fleet["physical_space_gib"] += total
+		fleet["physical_used_gib"] += total - free
+		fleet["physical_free_gib"] += free
+		fleet["logical_space_gib"] += total * factor
+		fleet["logical_used_gib"] += (total - free) * factor
+		fleet["logical_free_gib"] += free * factor
+		fleet["snapshot_space_gib"] += data['spaceUsedSnapshotsHypervisorGiB'] + data['spaceUsedSnapshotsTintriGiB']
+		fleet["number_of_vms"] += data['vmsCount']
+		percent_used = 100 - (free / total * 100) if total else 0
+		if worst is None or percent_used > worst[0]:
+			worst = (percent_used, server_name)
+	fleet["devices_collected"] = len(collected)
+	fleet["coverage_pct"] = round(len(collected) / len(arguments.args.server_names) * 100, 2) if arguments.args.server_names else 0
+	fleet["devices_missing"] = [device for device in arguments.args.server_names if device not in collected]
+	if fleet["physical_space_gib"]:
+		fleet["percent_used"] = 100 - (fleet["physical_free_gib"] / fleet["physical_space_gib"] * 100)
+	if worst is not None:
+		fleet["worst_percent_used"] = worst[0]
+		fleet["worst_percent_used_device"] = worst[1]
+	if device_snapshot_counts:
+		fleet["snapshot_count"] = sum(device_snapshot_counts.values())
+	if arguments.args.metrics:
+		# names can't be metric values
+		fleet.pop("devices_missing")
+		fleet.pop("worst_percent_used_device", None)
+	return({field: value for field, value in fleet.items() if value is not None})
+
+# write all buffered device rows out to the shared CSV sink
+def write_vmstats_csv(csv_rows:list):
+	'''
+	Opens the vmstats CSV once for the run (old CSVs are cleaned up here, once)
+	All device rows are appended in a single write, header is only written if the file is new
+	'''
+	if arguments.args.debug:
+		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Writing CSV Output for " + str(len(csv_rows)) + " device(s).")
+	log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Writing CSV Output for " + str(len(csv_rows)) + " device(s)."])
+
+	# create a wr_logging class for the CSV file
+	event_csv = log.CSVFile("vmstats.csv", log_folder=arguments.args.csv_location, remove_old_logs=True, log_retention_days=arguments.args.retain_csv, prefix_date=True, debug=False)
+	event_csv.writeLinesToCSV(csv_rows, header_row=vmstats_csv_header)
+
+	if arguments.args.debug:
+		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Writing CSV: Complete")
+	log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Writing CSV: Complete"])
+
+# write all buffered device rows out to the optional parquet sink
+def write_vmstats_parquet(parquet_rows:list):
+	'''
+	Writes the run's device rows to today's parquet partition (one part file per run)
+	Requires pyarrow, skipped with a log message if it is not installed
+	'''
+	from lib import wr_parquet
+	if not wr_parquet.isAvailable():
+		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Parquet output requested but pyarrow is not installed, skipping.")
+		log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Parquet output requested but pyarrow is not installed, skipping."])
+		return
+	if arguments.args.debug:
+		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Writing Parquet Output for " + str(len(parquet_rows)) + " device(s).")
+	log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Writing Parquet Output for " + str(len(parquet_rows)) + " device(s)."])
+
+	event_parquet = wr_parquet.ParquetFile("vmstats", vmstats_parquet_columns, log_folder=arguments.args.parquet_location, debug=arguments.args.debug_modules)
+	try:
+		event_parquet.writeLinesToParquet(parquet_rows)
+	finally:
+		event_parquet.close()
+
+	if arguments.args.debug:
+		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Writing Parquet: Complete - " + event_parquet.log_path)
+	log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Writing Parquet: Complete - " + event_parquet.log_path])
+
+# build a Splunk event / metric from a flat dict of fields
+def format_splunk_event(server_name:str, stats:dict, event_type=None, event_time=None) -> dict:
+	'''
+	Formats a compact dict of fields (per VM stats, snapshot metrics ...) as a Splunk event or metric
+	event_type is added as a field so the different record kinds can be told apart in Splunk
+	'''
+	fields = {"tintri_name": server_name}
+	if event_type:
+		fields["event_type"] = event_type
+	fields.update(stats)
+	if arguments.args.metrics:
+		# METRICS - numeric stats become metric values, names / ids are dimensions
+		return({
+			"time": event_time if event_time is not None else time.time(),
+			"event": "metric",
+			"host": server_name,
+			"source": arguments.args.event_source,
+			"sourcetype": arguments.args.event_sourcetype,
+			"fields": fields
+		})
+	# EVENTS
+	return({
+		"time": event_time if event_time is not None else time.time(),
+		"host": server_name,
+		"source": arguments.args.event_source,
+		"sourcetype": arguments.args.event_sourcetype,
+		"event": fields
+	})
+
+# build the Splunk event / metric for one VM
+def parse_vm_stats(server_name:str, vm_stats:dict) -> dict:
+	'''
+	Takes the compact per VM dict from wr_tintri.vmStats() and formats it as a Splunk event or metric
+	'''
+	return(format_splunk_event(server_name, vm_stats, event_type="vm_stats"))
+
+# walk the /vm pages of a device and emit one event per VM as the pages arrive
+def collect_vm_stats(session_id:str, server_name:str) -> bool:
+	'''
+	Streams /api/v310/vm page by page (vm_page_size VMs per request, api_pages_in_flight pages fetched at once or prefetched, see api_pagination) over one keep-alive session
+	Each VM is turned into a compact event and queued for HEC straight away, so only one page of VMs is ever held in memory
+	With vm_incremental, only VMs whose lastUpdatedTime moved past the stored per device watermark are emitted,
+	and every vm_full_sweep_hours all VMs are emitted and VMs that disappeared get a vm_deleted event
+	Returns True if every page was read
+	'''
+	if arguments.args.debug:
+		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Collecting per VM stats for: " + server_name)
+	log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Collecting per VM stats for: " + server_name])
+
+	# per device watermarks: {"last_full_sweep": epoch, "vms": {vm_uuid: lastUpdatedTime in epoch ms}}
+	watermarks = None
+	full_sweep = True
+	if arguments.args.vm_incremental:
+		watermarks = state.JSONStateFile(server_name + "_vm_watermarks", state_folder=arguments.args.state_location, default={"last_full_sweep": 0, "vms": {}}, debug=arguments.args.debug_modules)
+		full_sweep = time.time() - watermarks.data.get("last_full_sweep", 0) >= arguments.args.vm_full_sweep_hours * 3600
+		previous_vms = watermarks.data.get("vms", {})
+		seen_vms = {}
+
+	vm_rollup = rollup.VMRollup(top_n=arguments.args.vm_rollup_top) if arguments.args.vm_rollup else None
+	session = tintri.newSession(session_id, pool_size=arguments.args.api_pages_in_flight)
+	device_vm_count = 0
+	device_skipped = 0
+	completed = False
+	try:
+		for vm in tintri.iterListItems(session, server_name, '/vm', page_size=arguments.args.vm_page_size, pages_in_flight=arguments.args.api_pages_in_flight, pagination=arguments.args.api_pagination, target_seconds=arguments.args.api_page_seconds, debug=arguments.args.debug_modules):
+			vm_stats = tintri.vmStats(vm)
+			if vm_rollup is not None:
+				# every VM counts towards the rollup, unchanged ones included
+				vm_rollup.add(vm_stats, (server_name, vm_stats["vm_name"] or vm_stats["vm_uuid"]))
+			if watermarks is not None:
+				updated = tintri.parseTintriTime(vm_stats["last_updated_time"])
+				previous = previous_vms.get(vm_stats["vm_uuid"])
+				seen_vms[vm_stats["vm_uuid"]] = updated if updated is not None else previous
+				if not full_sweep and updated is not None and previous is not None and updated <= previous:
+					device_skipped += 1
+					continue
+			if arguments.args.vm_rollup_only:
+				continue
+			queue_splunk_event(parse_vm_stats(server_name, vm_stats))
+			device_vm_count += 1
+		completed = True
+	except Exception as ex:
+		log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Tintri collect_vm_stats ERROR on " + server_name + " after " + str(device_vm_count) + " VMs: " + str(ex)])
+		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Tintri collect_vm_stats ERROR on " + server_name + " after " + str(device_vm_count) + " VMs: " + str(ex))
+	finally:
+		session.close()
+
+	if watermarks is not None:
+		if completed and full_sweep:
+			# anything we had a watermark for that the full list no longer has is gone
+			for vm_uuid in previous_vms.keys() - seen_vms.keys():
+				queue_splunk_event(parse_vm_stats(server_name, {"vm_uuid": vm_uuid, "vm_deleted": 1}))
+				run_summary["vms_deleted"] += 1
+			watermarks.data = {"last_full_sweep": time.time(), "vms": seen_vms}
+		else:
+			# partial / incremental pass - keep what we didn't see this time
+			previous_vms.update(seen_vms)
+			watermarks.data["vms"] = previous_vms
+		watermarks.save()
+
+	if vm_rollup is not None and completed:
+		emit_vm_rollup(server_name, vm_rollup)
+	run_summary["vm_events"] += device_vm_count
+	run_summary["vms_skipped_unchanged"] += device_skipped
+	if arguments.args.debug:
+		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Per VM stats emitted for " + str(device_vm_count) + " VMs, skipped " + str(device_skipped) + " unchanged VMs on: " + server_name)
+	log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Per VM stats emitted for " + str(device_vm_count) + " VMs, skipped " + str(device_skipped) + " unchanged VMs on: " + server_name])
+	return(completed)
+
+# send a top N / quantile rollup of the per VM metrics and fold it into the fleet rollup
+def emit_vm_rollup(server_name:str, vm_rollup, event_type="vm_rollup"):
+	'''
+	One compact event with p50 / p95 / p99 / max and the top vm_rollup_top VMs per metric
+	Metrics can't carry the top lists, so those are left out when sending metrics
+	'''
+	global fleet_vm_rollup
+	summary = vm_rollup.summary()
+	if arguments.args.metrics:
+		summary = {field: value for field, value in summary.items() if not field.endswith("_top")}
+	queue_splunk_event(format_splunk_event(server_name, summary, event_type=event_type))
+	if event_type == "vm_rollup":
+		if fleet_vm_rollup is None:
+			fleet_vm_rollup = rollup.VMRollup(top_n=arguments.args.vm_rollup_top)
+		fleet_vm_rollup.merge(vm_rollup)
+
+# stream the snapshot list of a device down to the latest snapshot per VM and emit age / count metrics
+def collect_snapshot_stats(session_id:str, server_name:str) -> bool:
+	'''
+	Streams /api/v310/snapshot page by page into a LatestSnapshotIndex (one small slot per VM, nothing kept per snapshot)
+	Then emits one snapshot_summary per VM (count, latest snapshot time and age) and one device level snapshot rollup
+	With snapshot_changes the same stream is diffed against the previous run's snapshot uuid set instead, and only
+	snapshot_created / snapshot_deleted events are sent (plus the device rollup)
+	Returns True if every page was read
+	'''
+	if arguments.args.debug:
+		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Collecting snapshot stats for: " + server_name)
+	log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Collecting snapshot stats for: " + server_name])
+	snapshot_index = snapshots.LatestSnapshotIndex()
+	change_tracker = None
+	if arguments.args.snapshot_changes:
+		change_tracker = snapshots.SnapshotChangeTracker(os.path.join(log.normalizePathOS(str(arguments.args.state_location)), state.safeFileName(server_name + "_snapshot_uuids") + ".tsv"), debug=arguments.args.debug_modules)
+	session = tintri.newSession(session_id, pool_size=arguments.args.api_pages_in_flight)
+	try:
+		for snapshot in tintri.iterListItems(session, server_name, '/snapshot', page_size=arguments.args.snapshot_page_size, pages_in_flight=arguments.args.api_pages_in_flight, pagination=arguments.args.api_pagination, target_seconds=arguments.args.api_page_seconds, debug=arguments.args.debug_modules):
+			snapshot_index.addSnapshot(snapshot)
+			if change_tracker:
+				change_tracker.observe(snapshot)
+	except Exception as ex:
+		if change_tracker:
+			change_tracker.abort()
+		log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Tintri collect_snapshot_stats ERROR on " + server_name + " after " + str(snapshot_index.total_snapshots) + " snapshots: " + str(ex)])
+		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Tintri collect_snapshot_stats ERROR on " + server_name + " after " + str(snapshot_index.total_snapshots) + " snapshots: " + str(ex))
+		return(False)
+	finally:
+		session.close()
+
+	# one timestamp for the whole device so the ages line up
+	now = time.time()
+	if change_tracker:
+		try:
+			created, deleted = change_tracker.finish()
+		except OSError as ex:
+			created, deleted = [], []
+			log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Could not update the snapshot uuid set for " + server_name + ": " + str(ex)])
+		for event_type, rows in (("snapshot_created", created), ("snapshot_deleted", deleted)):
+			for snapshot_uuid, vm_uuid, create_time in rows:
+				change = {'snapshot_uuid': snapshot_uuid, 'vm_uuid': vm_uuid}
+				if create_time:
+					change['create_time'] = create_time / 1000
+				queue_splunk_event(format_splunk_event(server_name, change, event_type=event_type, event_time=now))
+		run_summary["snapshots_created"] += len(created)
+		run_summary["snapshots_deleted"] += len(deleted)
+		log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Snapshot changes on " + server_name + ": " + str(len(created)) + " created, " + str(len(deleted)) + " deleted" + (" (baseline run)" if change_tracker.baseline else "")])
+	else:
+		for vm_snapshot_stats in snapshot_index.iterVMStats(now):
+			queue_splunk_event(format_splunk_event(server_name, vm_snapshot_stats, event_type="vm_snapshot_summary", event_time=now))
+	queue_splunk_event(format_splunk_event(server_name, snapshot_index.deviceStats(now), event_type="device_snapshot_summary", event_time=now))
+	run_summary["snapshots_seen"] += snapshot_index.total_snapshots
+	device_snapshot_counts[server_name] = snapshot_index.total_snapshots
+	if arguments.args.debug:
+		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Snapshot stats collected for " + str(snapshot_index.total_snapshots) + " snapshots over " + str(len(snapshot_index)) + " VMs on: " + server_name)
+	log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Snapshot stats collected for " + str(snapshot_index.total_snapshots) + " snapshots over " + str(len(snapshot_index)) + " VMs on: " + server_name])
+	return(True)
+
+# join VMs, their virtual disks and their latest snapshot into one enriched event per VM
+def collect_inventory(session_id:str, server_name:str) -> bool:
+	'''
+	Streams /api/v310/vm, /virtualDisk and /snapshot once each into an InventoryIndex keyed by VM uuid
+	Disks and snapshots are matched to their VM by uuid lookup as they arrive, then one vm_inventory event per VM
+	and one device_inventory rollup are emitted (disk_names is left out of the VM events when sending metrics)
+	Returns True if every page of every list was read, nothing is emitted for a device with a partial inventory
+	'''
+	if arguments.args.debug:
+		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Collecting inventory for: " + server_name)
+	log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Collecting inventory for: " + server_name])
+	inventory_index = inventory.InventoryIndex()
+	session = tintri.newSession(session_id, pool_size=arguments.args.api_pages_in_flight)
+	try:
+		for path, page_size, add in (('/vm', arguments.args.vm_page_size, inventory_index.addVM), ('/virtualDisk', arguments.args.vm_page_size, inventory_index.addVirtualDisk), ('/snapshot', arguments.args.snapshot_page_size, inventory_index.addSnapshot)):
+			for item in tintri.iterListItems(session, server_name, path, page_size=page_size, pages_in_flight=arguments.args.api_pages_in_flight, pagination=arguments.args.api_pagination, target_seconds=arguments.args.api_page_seconds, debug=arguments.args.debug_modules):
+				add(item)
+	except Exception as ex:
+		log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Tintri collect_inventory ERROR on " + server_name + ": " + str(ex)])
+		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Tintri collect_inventory ERROR on " + server_name + ": " + str(ex))
+		return(False)
+	finally:
+		session.close()
+
+	now = time.time()
+	for enriched in inventory_index.iterEnrichedVMs(now):
+		if arguments.args.metrics:
+			enriched.pop('disk_names', None) # metrics can't carry the list of disk names
+		queue_splunk_event(format_splunk_event(server_name, enriched, event_type="vm_inventory", event_time=now))
+	device_stats = inventory_index.deviceStats()
+	queue_splunk_event(format_splunk_event(server_name, device_stats, event_type="device_inventory", event_time=now))
+	run_summary["inventory_vms"] += len(inventory_index)
+	device_snapshot_counts[server_name] = inventory_index.snapshot_index.total_snapshots
+	if arguments.args.debug:
+		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Inventory collected on " + server_name + ": " + json.dumps(device_stats))
+	log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Inventory collected on " + server_name + ": " + json.dumps(device_stats)])
+	return(True)
+
+# send a batch of realtime samples - folded into windows if aggregation is on, gated around anomalies if detection is on
+def queue_realtime_samples(samples:list, aggregator=None, gate=None):
+	run_summary["realtime_samples"] += len(samples)
+	for sample in samples:
+		if aggregator is not None:
+			queue_realtime_windows(aggregator.add(sample))
+		if gate is not None:
+			send = gate.process(sample)
+		elif aggregator is None:
+			send = [sample]
+		else:
+			continue
+		for out in send:
+			out = dict(out)
+			sample_time = out.pop("time")
+			queue_splunk_event(format_splunk_event(out.pop("tintri_name"), out, event_type="realtime_sample", event_time=sample_time))
+		run_summary["realtime_samples_sent"] += len(send)
+
+# send closed aggregation windows, stamped with the start of their window
+def queue_realtime_windows(windows:list):
+	for window in windows:
+		queue_splunk_event(format_splunk_event(window.pop("tintri_name"), window, event_type="realtime_window", event_time=window["window_start"]))
+	run_summary["realtime_windows"] += len(windows)
+
+# poll the realtime stats of every logged in device for realtime_seconds
+def run_realtime_sampler(devices:list):
+	'''
+	One RealtimeSampler thread (and one keep-alive session) per device, polling every realtime_interval seconds
+	The ring buffers are drained to HEC every interval from this thread, at the end a sampler_cost event per device
+	reports what the sampling cost the array and the forwarder (requests per second, CPU per sample ...)
+	With aggregate_seconds the samples are folded per device and datastore into tumbling min/max/avg/last/count
+	windows and only the windows are sent, flushed as each window ends and on shutdown
+	With anomaly_detection raw samples are only sent around anomalies (and every anomaly_downsample-th otherwise,
+	unless windows are being sent anyway), the run summary reports how much was held back
+	'''
+	if arguments.args.debug:
+		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Sampling realtime stats of " + str(len(devices)) + " device(s) every " + str(arguments.args.realtime_interval) + "s for " + str(arguments.args.realtime_seconds) + "s")
+	log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Sampling realtime stats of " + str(len(devices)) + " device(s) every " + str(arguments.args.realtime_interval) + "s for " + str(arguments.args.realtime_seconds) + "s"])
+	samplers = []
+	for device, session_id in devices:
+		datastore_uuids = state.JSONStateFile(device + "_datastores", state_folder=arguments.args.state_location, default={"uuids": []}).data.get("uuids") or ["default"]
+		samplers.append(sampler.RealtimeSampler(device, session_id, datastore_uuids, interval_seconds=arguments.args.realtime_interval, buffer_size=arguments.args.realtime_buffer, debug=arguments.args.debug_modules))
+	aggregator = None
+	if arguments.args.aggregate_seconds:
+		aggregator = aggregate.WindowAggregator(arguments.args.aggregate_seconds, ("tintri_name", "datastore_uuid"), grace_seconds=arguments.args.realtime_interval, debug=arguments.args.debug_modules)
+	gate = None
+	if arguments.args.anomaly_detection:
+		# the windows already cover the quiet periods, so no downsampled raw samples next to them
+		gate = anomaly.AnomalyGate(("tintri_name", "datastore_uuid"), zscore=arguments.args.anomaly_zscore, context=arguments.args.anomaly_context, downsample_every=0 if aggregator is not None else arguments.args.anomaly_downsample, metrics=arguments.args.anomaly_metrics or anomaly.DEFAULT_METRICS)
+	for device_sampler in samplers:
+		device_sampler.start()
+	end = time.monotonic() + arguments.args.realtime_seconds
+	try:
+		while time.monotonic() < end:
+			time.sleep(max(min(max(arguments.args.realtime_interval, 1), end - time.monotonic()), 0))
+			for device_sampler in samplers:
+				queue_realtime_samples(device_sampler.drain(), aggregator, gate)
+			if aggregator is not None:
+				queue_realtime_windows(aggregator.flushDue())
+	finally:
+		for device_sampler in samplers:
+			device_sampler.stop()
+			queue_realtime_samples(device_sampler.drain(), aggregator, gate)
+		if aggregator is not None:
+			queue_realtime_windows(aggregator.flushAll())
+	if run_summary["realtime_samples"]:
+		# windows are events too, what was saved is everything beyond the raw samples and windows actually sent
+		run_summary["realtime_volume_saved_pct"] = round((1 - (run_summary["realtime_samples_sent"] + run_summary["realtime_windows"]) / run_summary["realtime_samples"]) * 100, 2)
+	if gate is not None:
+		run_summary["realtime_anomalies"] += gate.anomalies
+		log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Realtime anomaly gate: " + json.dumps(gate.summary())])
+	now = time.time()
+	for device_sampler in samplers:
+		cost = device_sampler.cost()
+		queue_splunk_event(format_splunk_event(device_sampler.server_name, cost, event_type="sampler_cost", event_time=now))
+		print("tintri_ta_realtime_" + device_sampler.server_name + ":" + json.dumps(cost)) # in non-debug mode this will get sent to Splunk log - formatted as such
+		log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Realtime sampler cost on " + device_sampler.server_name + ": " + json.dumps(cost)])
+
+# pull one device's historic stats window by window, resuming from its checkpoint
+def backfill_device(server_name:str, session_id:str, start:float, end:float) -> bool:
+	'''
+	Reads /datastore/<uuid>/statsHistoric of every (cached) datastore one backfill_window_minutes window at a time
+	Samples are sent stamped with the appliance's own sample times, each window straight to HEC (not through the shared
+	queue), and the device's checkpoint only moves on once HEC has accepted all of them, so a stopped backfill resumes
+	without gaps - a failed send stops the device there and the window is sent again on the next run
+	Returns True if the whole range is done
+	'''
+	checkpoint = backfill.BackfillCheckpoint(server_name, start, end, state_folder=arguments.args.state_location, debug=arguments.args.debug_modules)
+	datastore_uuids = state.JSONStateFile(server_name + "_datastores", state_folder=arguments.args.state_location, default={"uuids": []}).data.get("uuids") or ["default"]
+	session = tintri.newSession(session_id, pool_size=1)
+	try:
+		for window_start, window_end in backfill.iterWindows(checkpoint.done_until, end, arguments.args.backfill_window_minutes * 60):
+			samples = []
+			for datastore_uuid in datastore_uuids:
+				stats = tintri.getJSON(session, server_name, '/datastore/' + datastore_uuid + '/statsHistoric', params={'since': backfill.isoTime(window_start), 'until': backfill.isoTime(window_end)})
+				samples.extend(sample for sample in backfill.historicSamples(server_name, datastore_uuid, stats) if window_start <= sample["time"] < window_end)
+			events = []
+			for sample in samples:
+				sample_time = sample.pop("time")
+				events.append(format_splunk_event(sample.pop("tintri_name"), sample, event_type="historic_stats", event_time=sample_time))
+			with backfill_lock:
+				sent = all(send_to_splunk_hec(events[i:i + arguments.args.hec_batch_size]) for i in range(0, len(events), arguments.args.hec_batch_size))
+				if sent:
+					run_summary["backfill_samples"] += len(samples)
+			if not sent:
+				log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Tintri backfill stopped on " + server_name + " at " + backfill.isoTime(checkpoint.done_until) + ": Splunk HEC did not accept the window"])
+				print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Tintri backfill stopped on " + server_name + " at " + backfill.isoTime(checkpoint.done_until) + ": Splunk HEC did not accept the window")
+				return(False)
+			checkpoint.advance(window_end)
+			if arguments.args.debug:
+				print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Backfilled " + str(len(samples)) + " samples for " + backfill.isoTime(window_start) + " - " + backfill.isoTime(window_end) + " on: " + server_name)
+	except Exception as ex:
+		log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Tintri backfill ERROR on " + server_name + " at " + backfill.isoTime(checkpoint.done_until) + ": " + str(ex)])
+		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Tintri backfill ERROR on " + server_name + " at " + backfill.isoTime(checkpoint.done_until) + ": " + str(ex))
+		return(False)
+	finally:
+		session.close()
+	log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Backfill complete up to " + backfill.isoTime(end) + " on: " + server_name])
+	return(True)
+
+# backfill every logged in device at once
+def run_backfill(devices:list):
+	start = backfill.parseTime(arguments.args.backfill_from)
+	end = backfill.parseTime(arguments.args.backfill_to) if arguments.args.backfill_to else time.time()
+	if arguments.args.debug:
+		print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Backfilling historic stats " + backfill.isoTime(start) + " - " + backfill.isoTime(end) + " for " + str(len(devices)) + " device(s)")
+	log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Backfilling historic stats " + backfill.isoTime(start) + " - " + backfill.isoTime(end) + " for " + str(len(devices)) + " device(s)"])
+	with concurrent.futures.ThreadPoolExecutor(max_workers=max(len(devices), 1)) as executor:
+		futures = {executor.submit(backfill_device, device, session_id, start, end): device for device, session_id in devices}
+		for future in concurrent.futures.as_completed(futures):
+			with backfill_lock: # workers print HEC status lines while holding it
+				print("tintri_ta_backfill_" + futures[future] + (":success" if future.result() else ":failed")) # in non-debug mode this will get sent to Splunk log - formatted as such
+
+# add an event to the HEC queue, sending a batch whenever it fills up
+def queue_splunk_event(event:dict):
+	'''
+	Events are sent in batches of hec_batch_size so large per VM collections never build up in memory
+	'''
+	if arguments.args.csv_only:
+		return
+	splunk_events_list.append(event)
+	if len(splunk_events_list) >= arguments.args.hec_batch_size:
+		send_to_splunk_hec(splunk_events_list)
+		splunk_events_list.clear()
+
 # send events to Splunk
 def send_to_splunk_hec(splunk_events_list:list):
 	'''
 	Input a list of Dictionaries
 	Each dict in the list represents an event in Splunk
+	Returns True only if Splunk accepted them (status 200) - False if the send failed or nothing was sent (csv only)
 	'''
 	if not arguments.args.csv_only:
 		headers = {'Authorization': 'Splunk ' + arguments.args.splunk_hec_token}
@@ -379,10 +1033,18 @@ def send_to_splunk_hec(splunk_events_list:list):
 			print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Attempting to send events to Splunk: " + arguments.args.splunk_uri + "/services/collector\n" )
 		log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Attempting to send events to Splunk: " + arguments.args.splunk_uri + "/services/collector"])
 
-		r = requests.post(arguments.args.splunk_uri + '/services/collector', headers=headers, data=final, verify=False)
+		try:
+			r = requests.post(arguments.args.splunk_uri + '/services/collector', headers=headers, data=final, verify=False, timeout=hec_timeout)
+		except requests.RequestException as ex:
+			print("tintri_ta_upload_to_splunk_status_code:failed") # in non-debug mode this will get sent to Splunk log - formatted as such
+			print("\n")
+			log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Upload to Splunk ERROR: " + str(ex)])
+			return(False)
 		print("tintri_ta_upload_to_splunk_status_code:" + str(r.status_code)) # in non-debug mode this will get sent to Splunk log - formatted as such
 		print("\n")
 		log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Upload to Splunk Status: " + str(r.status_code)])
+		return(r.status_code == 200)
+	return(False)
 
 ### Runtime ########################################### >>
 
@@ -397,6 +1059,10 @@ for device in arguments.args.server_names:
 		print("tintri_ta_login_" + device + ":success") # in non-debug mode this will get sent to Splunk log - formatted as such
 		print("\n")
 		log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Tintri Device Login for " + device + ": SUCCESS "])
+		if arguments.args.realtime_seconds:
+			realtime_devices.append((device, tintri_session_id[0]))
+		if arguments.args.backfill_from:
+			backfill_devices.append((device, tintri_session_id[0]))
 		vmstats_tmp = get_vmstats(tintri_session_id[0], device)
 		if vmstats_tmp[1]:
 			vmstats_raw_json.append(vmstats_tmp[0])
@@ -405,6 +1071,24 @@ for device in arguments.args.server_names:
 			print("tintri_ta_device_info_" + device + ":success") # in non-debug mode this will get sent to Splunk log - formatted as such
 			print("\n")
 			log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Get Device Info for : " + device + ": SUCCESS "])	
+			if arguments.args.vm_stats:
+				if collect_vm_stats(tintri_session_id[0], device):
+					print("tintri_ta_vm_stats_" + device + ":success") # in non-debug mode this will get sent to Splunk log - formatted as such
+				else:
+					print("tintri_ta_vm_stats_" + device + ":failed") # in non-debug mode this will get sent to Splunk log - formatted as such
+				print("\n")
+			if arguments.args.snapshot_stats:
+				if collect_snapshot_stats(tintri_session_id[0], device):
+					print("tintri_ta_snapshot_stats_" + device + ":success") # in non-debug mode this will get sent to Splunk log - formatted as such
+				else:
+					print("tintri_ta_snapshot_stats_" + device + ":failed") # in non-debug mode this will get sent to Splunk log - formatted as such
+				print("\n")
+			if arguments.args.inventory:
+				if collect_inventory(tintri_session_id[0], device):
+					print("tintri_ta_inventory_" + device + ":success") # in non-debug mode this will get sent to Splunk log - formatted as such
+				else:
+					print("tintri_ta_inventory_" + device + ":failed") # in non-debug mode this will get sent to Splunk log - formatted as such
+				print("\n")
 		else:
 			if arguments.args.debug:
 				print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Get Device Info Failed for device: " + device + " ...skipping this one.\n" )
@@ -418,13 +1102,17 @@ for device in arguments.args.server_names:
 		print("\n")
 		log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Tintri Device Login for " + device + ": FAILED "])
 
+# fleet wide per VM rollup, only when more than one device went into it
+if fleet_vm_rollup is not None and len(arguments.args.server_names) > 1:
+	emit_vm_rollup("tintri_fleet", fleet_vm_rollup, event_type="fleet_vm_rollup")
+
 # parse each json return into splunk friendly json and add to list
 if vmstats_raw_json:
 	for vmstat in vmstats_raw_json:
 		vmstat_raw_tmp = parse_vmstats(vmstat)
 		if vmstat_raw_tmp:
 			if not arguments.args.csv_only:
-				splunk_events_list.append(vmstat_raw_tmp)
+				queue_splunk_event(vmstat_raw_tmp)
 				if arguments.args.debug:
 					print("TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Succeeded in parsing device stats for: " + device + ".\n" )
 				print("tintri_ta_parse_stats_" + device + ":success") # in non-debug mode this will get sent to Splunk log - formatted as such
@@ -438,7 +1126,37 @@ if vmstats_raw_json:
 				print("\n")
 				log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Failed to parse device stats for: " + device])			
 
+# fleet summary, one timestamp for the whole run
+if arguments.args.fleet_summary and not arguments.args.csv_only:
+	fleet_summary = build_fleet_summary(vmstats_raw_json)
+	queue_splunk_event(format_splunk_event("tintri_fleet", fleet_summary, event_type="fleet_summary", event_time=run_time))
+	log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Fleet summary: " + json.dumps(fleet_summary)])
+
+# write the buffered csv rows for all devices in one go - retention only runs once per run here
+if vmstats_csv_rows:
+	write_vmstats_csv(vmstats_csv_rows)
+
+# write the typed rows for all devices to the parquet sink
+if vmstats_parquet_rows:
+	write_vmstats_parquet(vmstats_parquet_rows)
+
+# historic stats for the requested range, all devices in parallel - HEC only, the checkpoints must not move past data sent nowhere
+if backfill_devices:
+	if arguments.args.csv_only:
+		print("tintri_ta_backfill:skipped_csv_only") # in non-debug mode this will get sent to Splunk log - formatted as such
+		log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Backfill skipped, historic stats are only sent via HEC and csv_only is set"])
+	else:
+		run_backfill(backfill_devices)
+
+# high frequency sampling runs after the regular collection, its samples go out through the same HEC batches
+if realtime_devices:
+	run_realtime_sampler(realtime_devices)
+
 # send event list to Splunk via HEC
 if splunk_events_list:
 	send_to_splunk_hec(splunk_events_list)
+
+# one line summary of the run - in non-debug mode this will get sent to Splunk log - formatted as such
+print("tintri_ta_run_summary:" + json.dumps(run_summary))
+log_file.writeLinesToFile(["TINTRI_TA(" + str(sys._getframe().f_lineno) +"): Run summary: " + json.dumps(run_summary)])
 sys.exit()
\ No newline at end of file
@@ -16,10 +16,26 @@ python3 script.py \
     -met False\
     -csv True \
     -csvo False \
+    -pq False \
+    -ads False \
+    -fs True \
+    -vm False \
+    -vmi False \
+    -vmr False \
+    -ss False \
+    -ssc False \
+    -inv False \
+    -hist False \
+    -fc False \
+    -rts 0 \
+    -aggs 60 \
+    -an False \
     -rc 5 \
     -d  True \
     -ll "{$SPLUNK_HOME}/etc/apps/splunk-tintri-vmstats/logs" \
-    -csvl "{$SPLUNK_HOME}/etc/apps/splunk-tintri-vmstats/csv"
+    -csvl "{$SPLUNK_HOME}/etc/apps/splunk-tintri-vmstats/csv" \
+    -pql "{$SPLUNK_HOME}/etc/apps/splunk-tintri-vmstats/parquet" \
+    -sl "{$SPLUNK_HOME}/etc/apps/splunk-tintri-vmstats/state"
 
 # You should always try and use the "AIO" (all in one) version as it doesn't need any outside dependencies including Python
 # \  = indicates cmd continues on next line in bash
@@ -33,7 +49,44 @@ python3 script.py \
 # -met = --metrics - True to send data as Metrics rather than Events to the HEC token
 # -csv = --csv_output - Write output to a CSV in addition to sending to Splunk HEC -> ./csv
 # -csvo = --csv_only - Write out a CSV of stats data only and skip send to Splunk
+# -pq = --parquet_output - Also write typed, compressed daily Parquet partitions (needs pyarrow installed, skipped if not) -> ./parquet
+# -ads = --all_datastores - Collect every datastore's statsSummary in parallel, one datastore_stats event each (HEC only) and the device event / csv row becomes their rollup, the datastore list is cached in -sl - False = datastore/default only (default False)
+# -dslh = --datastore_list_hours - How long the cached datastore list of a device is reused before listing again (default 24)
+# -fs = --fleet_summary - Send one fleet_summary event per run (host tintri_fleet, one timestamp): physical / logical space, used and free totals, VM and snapshot counts, worst percent_used and which devices were collected (default True)
+# -vm = --vm_stats - Also collect per VM stats (IOPS, throughput, latency, space), one event / metric per VM - sent via HEC only
+# -vmps = --vm_page_size - How many VMs to request per API page when collecting per VM stats (default 100)
+# -vmi = --vm_incremental - With -vm, only emit VMs whose lastUpdatedTime moved since the last run (per device watermarks in -sl)
+# -vmfs = --vm_full_sweep_hours - With -vmi, emit every VM and send vm_deleted events for VMs that are gone at most this many hours apart (default 24)
+# -vmr = --vm_rollup - With -vm, also send a vm_rollup event per device and a fleet_vm_rollup: p50 / p95 / p99 / max and the top N VMs for latency, IOPS, throughput and space
+# -vmrn = --vm_rollup_top - How many VMs the rollups list per metric (default 10)
+# -vmro = --vm_rollup_only - Send the rollups in place of the per VM events (turns -vmr on)
+# -ss = --snapshot_stats - Also collect snapshot count and latest snapshot age per VM plus a per device snapshot rollup - sent via HEC only
+# -ssc = --snapshot_changes - With -ss, send only snapshot_created / snapshot_deleted events for what changed since the last run instead of the per VM snapshot summaries (per device snapshot uuid sets in -sl)
+# -ssps = --snapshot_page_size - How many snapshots to request per API page when collecting snapshot stats (default 500)
+# -inv = --inventory - Also send one vm_inventory event per VM (stats + virtual disk count / space / names + latest snapshot) joined locally from one pass over /vm, /virtualDisk and /snapshot - sent via HEC only
+# -hist = --history - Keep a local capacity time series per device (physical / logical used, free, snapshot space) in -sl/history and add physical / logical_used_change_1d / 7d / 30d_gib, read back off it, to the device event
+# -histd = --history_days - Days of local capacity history kept per device (default 730)
+# -fc = --forecast - Add growth_gib_per_day and days_until_full to each device and datastore event, from an exponentially weighted regression of used space kept per device in -sl - with -hist a new forecast starts from the stored history
+# -fchl = --forecast_half_life_days - How fast old samples fade out of the forecast, in days (default 7)
+# -rts = --realtime_seconds - After the regular collection, poll each device's realtime datastore stats for this many seconds over one kept open session per device, realtime_sample + sampler_cost events via HEC only (default 0 = off)
+# -rti = --realtime_interval - Seconds between realtime samples of a device (default 5)
+# -rtb = --realtime_buffer - Samples buffered per device between HEC sends before the oldest are dropped (default 720)
+# -aggs = --aggregate_seconds - With -rts, fold the samples per device and datastore into tumbling windows of this many seconds (min / max / avg / last / count) and send one realtime_window event per window instead of every sample (default 0 = off)
+# -bff = --backfill_from - Backfill historic stats (historic_stats events via HEC, stamped with the appliance's sample times) from this time, epoch seconds or ISO 8601 i.e. '2024-05-01T00:00:00Z' - reruns resume from the per device checkpoint in -sl, skipped with -csvo (default off)
+# -bft = --backfill_to - End of the backfill range (default now)
+# -bfw = --backfill_window_minutes - Size of each historic stats request / checkpoint step in minutes (default 60)
+# -an = --anomaly_detection - With -rts, keep EWMA mean / variance baselines per device, datastore and metric and only send raw samples around anomalies (flagged anomaly=1), every -and-th sample otherwise - the run summary reports the volume saved
+# -anz = --anomaly_zscore - Standard deviations off baseline that count as an anomaly (default 3)
+# -anc = --anomaly_context - Full resolution samples sent before and after an anomaly (default 5)
+# -and = --anomaly_downsample - Send every Nth uneventful sample, 0 = none (default 12, always none when -aggs is on as the windows cover it)
+# -anm = --anomaly_metrics - Realtime metrics scored for anomalies, separated by spaces i.e. 'iops_total' 'latency_total_ms' (default every IOPS, throughput and latency field - space fields only move in small steps)
+# -apif = --api_pages_in_flight - Max concurrent page requests per Tintri device when reading paginated lists like /vm (default 4, 1 = one at a time)
+# -apm = --api_pagination - 'offset' (default) fetches offset windows concurrently, 'cursor' follows each page's 'next' link and prefetches -apif pages ahead in the background
+# -apts = --api_page_seconds - If above 0, page sizes are tuned so each page takes about this many seconds to come back (default 0 = off)
+# -hecb = --hec_batch_size - Send events to HEC in batches of this many events (default 500)
 # -rc = --retain_csv - Number of days to retain CSV outputs (csvs older than this number of days will be auto removed next run)
 # -d  = --debug - Enable more console debugging
 # -ll = --log_location - full path to where to store the logs, i.e '/opt/splunk/var/log/tintri_ta' or "{$SPLUNK_HOME}/etc/apps/splunk-tintri-vmstats/logs" - use double quotes and {} if using $SPLUNK_HOME
-# -csvl = --csv_location - full path to where to store the csvs, i.e '/opt/splunk/var/log/tintri_ta/csv' or "{$SPLUNK_HOME}/etc/apps/splunk-tintri-vmstats/csv" - use double quotes and {} if using $SPLUNK_HOME
\ No newline at end of file
+# -csvl = --csv_location - full path to where to store the csvs, i.e '/opt/splunk/var/log/tintri_ta/csv' or "{$SPLUNK_HOME}/etc/apps/splunk-tintri-vmstats/csv" - use double quotes and {} if using $SPLUNK_HOME
+# -pql = --parquet_location - full path to where to store the parquet partitions, i.e "{$SPLUNK_HOME}/etc/apps/splunk-tintri-vmstats/parquet"
+# -sl = --state_location - full path to where state kept between runs is stored (watermarks, checkpoints), i.e "{$SPLUNK_HOME}/etc/apps/splunk-tintri-vmstats/state"
\ No newline at end of file
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+##############################################################################################################
+# Contact: Will Rivendell
+# 	E1: wrivendell@splunk.com
+# 	E2: contact@willrivendell.com
+##############################################################################################################
+# Builds the TA's bin folder into one self contained zipapp: dist/splunk-tintri-vmstats.pyz
+# - script.py + lib/ + vendored, pruned pure python dependencies (requests and what it pulls in)
+# - everything precompiled to .pyc with the .py sources dropped, so a cold start reads one file and
+#   never compiles anything or walks site-packages
+# - optional dependencies (pandas, pyarrow) are not vendored, the TA loads them on demand if installed
+# Run it with the same python3 minor version the forwarder will run the .pyz with (.pyc files are version specific)
+# Usage: python3 tools/build_zipapp.py [--output dist/splunk-tintri-vmstats.pyz] [--compress]
+# Then in bin/script.sh: python3 splunk-tintri-vmstats.pyz -sn ... (same arguments as script.py)
+
+### IMPORTS ###########################################
+import os, sys, shutil, argparse, subprocess, tempfile, compileall, zipapp
+
+### GLOBALS ###########################################
+REPO_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BIN_FOLDER = os.path.join(REPO_FOLDER, 'src', 'splunk-tintri-vmstats', 'bin')
+VENDORED = ['requests'] # top level requirements, their own dependencies come along
+PRUNE_FOLDERS = ('__pycache__', 'tests', 'test', 'bin')
+PRUNE_SUFFIXES = ('.dist-info', '.egg-info')
+PRUNE_EXTENSIONS = ('.pyi', '.so', '.pyd', '.typed', '.md', '.txt') # .so can't be imported from a zip, the packages fall back to pure python
+MAIN = '''# zipapp entry point - runs the TA exactly like `python3 script.py`
+import runpy
+runpy.run_module('script', run_name='__main__')
+'''
+
+### FUNCTIONS ###########################################
+def stageSources(staging:str):
+	shutil.copy2(os.path.join(BIN_FOLDER, 'script.py'), staging)
+	os.makedirs(os.path.join(staging, 'lib'))
+	for f in os.listdir(os.path.join(BIN_FOLDER, 'lib')):
+		if f.endswith('.py'):
+			shutil.copy2(os.path.join(BIN_FOLDER, 'lib', f), os.path.join(staging, 'lib'))
+	# zipimport needs a regular package, the loose layout gets away with a namespace package
+	open(os.path.join(staging, 'lib', '__init__.py'), 'a').close()
+	with open(os.path.join(staging, '__main__.py'), 'w') as main_file:
+		main_file.write(MAIN)
+
+def vendorDependencies(staging:str):
+	subprocess.run([sys.executable, '-m', 'pip', 'install', '--quiet', '--no-compile', '--target', staging] + VENDORED, check=True)
+
+def prune(staging:str):
+	'''
+	Drops everything the TA never imports at runtime
+	'''
+	for root, dirs, files in os.walk(staging, topdown=True):
+		for d in list(dirs):
+			if d in PRUNE_FOLDERS or d.endswith(PRUNE_SUFFIXES):
+				shutil.rmtree(os.path.join(root, d))
+				dirs.remove(d)
+		for f in files:
+			if f.endswith(PRUNE_EXTENSIONS) and not f == 'cacert.pem':
+				os.remove(os.path.join(root, f))
+
+def precompile(staging:str):
+	'''
+	Compiles every module to a legacy (next to the source) .pyc and removes the .py, zipimport loads those directly
+	'''
+	if not compileall.compile_dir(staging, quiet=1, legacy=True):
+		sys.exit("Compiling the staged sources failed")
+	for root, dirs, files in os.walk(staging):
+		for f in files:
+			if f.endswith('.py') and not (root == staging and f == '__main__.py'):
+				os.remove(os.path.join(root, f))
+
+### RUNTIME ###########################################
+parser = argparse.ArgumentParser()
+parser.add_argument("--output", default=os.path.join(REPO_FOLDER, 'dist', 'splunk-tintri-vmstats.pyz'), help="Path of the .pyz to write.")
+parser.add_argument("--compress", action='store_true', help="Deflate the archive members (smaller file, slightly slower start).")
+args = parser.parse_args()
+
+with tempfile.TemporaryDirectory() as staging:
+	stageSources(staging)
+	vendorDependencies(staging)
+	prune(staging)
+	precompile(staging)
+	os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+	zipapp.create_archive(staging, args.output, interpreter='/usr/bin/env python3', compressed=args.compress)
+print("Built " + args.output + " (" + str(round(os.path.getsize(args.output) / 1024)) + " KiB) for python " + str(sys.version_info[0]) + "." + str(sys.version_info[1]))